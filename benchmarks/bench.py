@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Benchmarks of the model kernels and the data paths.
+
+Synthetic inputs are generated in a temporary directory: a sqlite run
+database with the columns of `RunDB.variables`, and npz files and columnar
+stores of events with the groups of `Data`. Each benchmark reports its
+throughput and the peak memory traced by tracemalloc. Results are saved in
+benchmarks/results/<commit>.json, and compared with the results of another
+commit with --compare.
+
+    python3 benchmarks/bench.py
+    python3 benchmarks/bench.py -k model --compare 1a2b3c4
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from os.path import dirname, join, realpath
+
+import numpy as np
+
+from pyg2pana import Data, RunDB
+from pyg2pana.models import Elastic, PBosted
+
+_here = dirname(realpath(__file__))
+_e0 = 2.2535
+_theta = np.radians(5.69)
+
+_db_values = {
+    'RunQuality': 1,
+    'Energy': _e0 * 1000,
+    'D1p': 2.0,
+    'ps1': 1.0,
+    'ps3': 1.0,
+    'TEff': 0.99,
+    'Deadtime': 0.1,
+    'DTPlus': 0.11,
+    'DTMinus': 0.09,
+    'OneTrackEff': 0.9,
+    'AllTrackEff': 0.95,
+    'CerDetEff': 0.98,
+    'PRDetEff': 0.97,
+    'CerCut': 1.0,
+    'PR1Cut': 0.2,
+    'SumCut': 0.5,
+    'QTotal': 1000.0,
+    'QPlus': 500.0,
+    'QMinus': 500.0,
+    'xSR': 0.0,
+    'ySR': 0.0,
+    'rSR': 1.0,
+}
+
+benchmarks = {}
+
+
+def benchmark(unit):
+    """
+    Register a benchmark, the function returns the number of processed
+    `unit` and is called with the synthetic inputs.
+    """
+
+    def decorator(func):
+        benchmarks[func.__name__] = (func, unit)
+        return func
+
+    return decorator
+
+
+def make_db(file_, runs):
+    con = sqlite3.connect(file_)
+    columns = ['RunNumber'] + [x[1] for x in RunDB.variables]
+    defaults = {
+        'int': 0,
+        'float': 0.0,
+        'string': '',
+        'time': '2012-03-01 10:00:00',
+    }
+    for table in ('AnaInfoL', 'AnaInfoR'):
+        con.execute('CREATE TABLE {} ({})'.format(table, ','.join(columns)))
+    for run in runs:
+        values = [run] + [
+            str(_db_values.get(x, defaults[y]))
+            for _, x, y in RunDB.variables
+        ]
+        con.execute(
+            'INSERT INTO {} VALUES ({})'.format(
+                'AnaInfoR' if run > 20000 else 'AnaInfoL',
+                ','.join('?' * len(values)),
+            ),
+            values,
+        )
+    con.commit()
+    con.close()
+
+
+def make_events(n, seed=0):
+    rng = np.random.default_rng(seed)
+
+    def group(names, scale=0.02):
+        return np.rec.fromarrays(
+            [rng.normal(0, scale, n) for _ in names.split(',')],
+            names=names,
+        )
+
+    return {
+        'hel': np.rec.fromarrays(
+            [rng.choice([-1.0, 1.0], n), np.zeros(n)],
+            names='val,err',
+        ),
+        'bpm': group('x,y,t,p', 0.002),
+        'sr': group('x,y', 1.0),
+        'gold': group('t,y,p,f3'),
+        'rec': group('x,t,y,p,d'),
+    }
+
+
+def make_inputs(path, events):
+    runs = list(range(5600, 5900))
+    RunDB.db_file = join(path, 'g2p.db')
+    make_db(RunDB.db_file, runs)
+
+    inputs = {'runs': runs, 'events': events}
+    groups = make_events(events)
+    inputs['npz'] = join(path, 'g2p_5600.npz')
+    np.savez_compressed(inputs['npz'], **groups)
+    inputs['cols'] = join(path, 'g2p_5600.cols')
+    Data([inputs['npz']]).save(inputs['cols'])
+    return inputs
+
+
+@benchmark('points')
+def model_pbosted(inputs):
+    n = 10000
+    model = PBosted(1, 1)
+    model(_e0, np.linspace(0.5, 2.2, n), _theta)
+    return n
+
+
+@benchmark('points')
+def model_radiate_quad(inputs):
+    n = 10
+    model = PBosted(7, 14, radiate=True)
+    model(_e0, np.linspace(1.0, 2.0, n), _theta, 0.0008, 0.0008)
+    return n
+
+
+@benchmark('points')
+def model_radiate_gauss(inputs):
+    n = 100
+    model = PBosted(7, 14, radiate=True)
+    model(_e0, np.linspace(1.0, 2.0, n), _theta, 0.0008, 0.0008,
+          method='gauss')
+    return n
+
+
+@benchmark('points')
+def model_elastic_density(inputs):
+    n = 100000
+    model = Elastic(6, 12)
+    model(_e0, np.linspace(0.05, 0.2, n))
+    return n
+
+
+@benchmark('points')
+def model_elastic_tail(inputs):
+    n = 100000
+    model = Elastic(6, 12)
+    model.tail(_e0, np.linspace(1.0, 2.2, n), _theta, 0.0008, 0.0008)
+    return n
+
+
+@benchmark('runs')
+def rundb_init(inputs):
+    RunDB.clear_cache()
+    for run in inputs['runs']:
+        RunDB(run)
+    return len(inputs['runs'])
+
+
+@benchmark('runs')
+def rundb_snapshot(inputs):
+    RunDB.clear_cache()
+    RunDB.get_scale(RunDB.snapshot(inputs['runs']))
+    return len(inputs['runs'])
+
+
+@benchmark('events')
+def data_load_npz(inputs):
+    data = Data([inputs['npz']])
+    data.rec.d.sum()
+    return inputs['events']
+
+
+@benchmark('events')
+def data_load_cols(inputs):
+    data = Data([inputs['cols']])
+    data.rec.d.sum()
+    return inputs['events']
+
+
+@benchmark('events')
+def data_histogram(inputs):
+    data = Data([inputs['cols']])
+    data.cuts = {
+        'y': (-0.01, 0.01),
+        't': (-0.03, 0.03),
+        'p': (-0.02, 0.02),
+        'sr': 1,
+    }
+    for _ in range(5):
+        hist = data.get_histogram('nu', bins=100, range=(100, 400))
+    assert hist.sum() > 0
+    return inputs['events']
+
+
+def run(func, inputs, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        n = func(inputs)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(inputs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'n': n, 'time': best, 'rate': n / best, 'peak_mb': peak / 2**20}
+
+
+def get_commit():
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=_here,
+            stderr=subprocess.DEVNULL,
+        ).decode().strip()
+        dirty = subprocess.check_output(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            cwd=_here,
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + '-dirty' if dirty else commit
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-k', default='', help='run benchmarks matching')
+    parser.add_argument('--events', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--results', default=join(_here, 'results'))
+    parser.add_argument('--compare', help='commit to compare with')
+    args = parser.parse_args()
+
+    # keep the model caches of this run out of the user cache
+    with tempfile.TemporaryDirectory() as path:
+        os.environ['PYG2PANA_CACHE'] = join(path, 'cache')
+        inputs = make_inputs(path, args.events)
+
+        results = {}
+        for name, (func, unit) in benchmarks.items():
+            if args.k not in name:
+                continue
+            results[name] = run(func, inputs, args.repeat)
+            results[name]['unit'] = unit
+
+    reference = {}
+    if args.compare:
+        with open(join(args.results, args.compare + '.json')) as f:
+            reference = json.load(f)['results']
+
+    for name, result in results.items():
+        line = '{:24s} {:12.4g} {}/s {:8.1f} MB'.format(
+            name,
+            result['rate'],
+            result['unit'],
+            result['peak_mb'],
+        )
+        if name in reference:
+            line += ' {:6.2f}x'.format(result['rate'] /
+                                       reference[name]['rate'])
+        print(line)
+
+    commit = get_commit()
+    os.makedirs(args.results, exist_ok=True)
+    with open(join(args.results, commit + '.json'), 'w') as f:
+        json.dump(
+            {
+                'commit': commit,
+                'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'machine': platform.platform(),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'events': args.events,
+                'results': results,
+            },
+            f,
+            indent=2,
+            sort_keys=True,
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -3,10 +3,13 @@ Analysis Software for g2p Experiment
 =====================================
 """
 
+from ._acceptance import Acceptance
 from ._data import Data
 from ._run_db import RunDB
+from ._run_set import RunSet
 from ._sim_file import SimFile
+from ._subtraction import Subtraction
 
-from . import configs, models
+from . import configs, correction, extract, models, pipeline
 
 __all__ = [s for s in dir() if not s.startswith('_')]
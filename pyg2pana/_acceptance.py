@@ -0,0 +1,217 @@
+# Author: Chao Gu, 2018
+
+import json
+from concurrent.futures import ProcessPoolExecutor
+from os.path import abspath
+
+import numpy as np
+
+__all__ = ['Acceptance']
+
+
+class Acceptance():
+    """
+    Acceptance Histogram
+    --------------------
+    Accumulable acceptance of a simulation sample. It holds the histogram of
+    the accepted events, the number of generated events and the generated
+    phase space, so that acceptances of different files of the same setting
+    can be merged by addition.
+
+    Parameters
+    ----------
+    var : str
+        Name of the histogrammed attribute of `SimFile`, such as 'nu'.
+    bins : int
+        Number of uniform bins.
+    range : (float, float)
+        Lower and upper edges.
+    cuts : dict
+        Cuts applied to the simulated events.
+    p0 : float
+        Central momentum.
+    phase_space : dict
+        Generated ranges of 'd', 't' and 'p'.
+    counts : rank-1 array of int, optional
+        Histogram of the accepted events.
+    n : int
+        Number of generated events.
+    files : sequence of str
+        Files already included.
+    """
+
+    def __init__(self, var, bins, range, cuts, p0, phase_space, *,
+                 counts=None, n=0, files=()):
+        self.var = var
+        self.bins = bins
+        self.range = tuple(range)
+        self.cuts = json.loads(json.dumps(cuts))
+        self.p0 = p0
+        self.phase_space = dict(phase_space)
+
+        if counts is None:
+            counts = np.zeros(bins, dtype=np.int64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.n = int(n)
+        self.files = list(files)
+
+    def __add__(self, other):
+        result = self.copy()
+        result += other
+        return result
+
+    def __iadd__(self, other):
+        if self._get_setting() != other._get_setting():
+            raise ValueError('acceptances of different settings')
+        if set(self.files) & set(other.files):
+            raise ValueError('file included twice')
+
+        self.counts = self.counts + other.counts
+        self.n += other.n
+        self.files += other.files
+        return self
+
+    def copy(self):
+        return Acceptance(
+            self.var,
+            self.bins,
+            self.range,
+            self.cuts,
+            self.p0,
+            self.phase_space,
+            counts=self.counts.copy(),
+            n=self.n,
+            files=self.files,
+        )
+
+    @classmethod
+    def from_sim(cls, sim, var, cuts, *, files=(), **kwargs):
+        """
+        Build the acceptance of a loaded `SimFile`.
+
+        Parameters
+        ----------
+        sim : SimFile
+            Simulation sample.
+        var : str
+            Name of the histogrammed attribute.
+        cuts : dict
+            Cuts, assigned to `sim.cuts`.
+        files : sequence of str
+            Files the sample was loaded from.
+        bins : int
+            Number of uniform bins.
+        range : (float, float)
+            Lower and upper edges.
+        """
+
+        sim.cuts = cuts
+        return cls(
+            var,
+            kwargs.get('bins'),
+            kwargs.get('range'),
+            cuts,
+            sim.p0,
+            sim.range,
+            counts=sim.get_histogram(var, **kwargs),
+            n=sim.n,
+            files=files,
+        )
+
+    @classmethod
+    def from_files(cls, files, var, cuts, *, workers=None, **kwargs):
+        """
+        Build the acceptance of simulation files, one file per process.
+
+        Parameters are the same as `Acceptance.from_sim`, `workers` is the
+        number of worker processes.
+        """
+
+        if not files:
+            raise ValueError('no files')
+
+        result = None
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_from_file, x, var, cuts, kwargs)
+                for x in files
+            ]
+            for future in futures:
+                acceptance = future.result()
+                result = acceptance if result is None else result + acceptance
+        return result
+
+    def update(self, files, *, workers=None):
+        """
+        Add the simulation files which are not included yet.
+        """
+
+        files = [x for x in files if abspath(x) not in self.files]
+        if files:
+            self += Acceptance.from_files(
+                files,
+                self.var,
+                self.cuts,
+                workers=workers,
+                bins=self.bins,
+                range=self.range,
+            )
+        return self
+
+    @property
+    def values(self):
+        """
+        Normalized acceptance, bins with less than 80% of the average counts
+        are suppressed.
+        """
+
+        hist = self.counts.copy()
+        ave = np.average(hist[hist > 0])
+        hist[hist < 0.8 * ave] = np.iinfo(np.int64).max
+        norm = self.n / (self.phase_space['t'] * self.phase_space['p'] *
+                         self.phase_space['d'] * self.p0)
+        return hist / norm
+
+    def save(self, file_):
+        meta = self._get_setting()
+        meta['files'] = self.files
+        np.savez(
+            file_,
+            counts=self.counts,
+            n=np.array([self.n]),
+            meta=np.array(json.dumps(meta)),
+        )
+
+    @classmethod
+    def load(cls, file_):
+        loaded = np.load(file_)
+        meta = json.loads(str(loaded['meta']))
+        return cls(
+            meta['var'],
+            meta['bins'],
+            meta['range'],
+            meta['cuts'],
+            meta['p0'],
+            meta['phase_space'],
+            counts=loaded['counts'],
+            n=int(loaded['n'][0]),
+            files=meta['files'],
+        )
+
+    def _get_setting(self):
+        return {
+            'var': self.var,
+            'bins': self.bins,
+            'range': list(self.range),
+            'cuts': self.cuts,
+            'p0': self.p0,
+            'phase_space': self.phase_space,
+        }
+
+
+def _from_file(file_, var, cuts, kwargs):
+    from ._sim_file import SimFile
+
+    sim = SimFile(file_)
+    return Acceptance.from_sim(sim, var, cuts, files=[abspath(file_)],
+                               **kwargs)
@@ -0,0 +1,174 @@
+# Author: Chao Gu, 2018
+
+import numpy as np
+
+__all__ = ['CutCache']
+
+
+class CutCache():
+    """
+    Cut Cache
+    ---------
+    Cache the variables and the masks of a set of window cuts. Every cut keeps
+    the mask of its last window as a packed bitmask, so changing one window
+    only recomputes that cut. The combined mask is cached until the windows
+    change.
+
+    Parameters
+    ----------
+    variables : dict
+        Functions without arguments returning the variable of each cut, keyed
+        by cut name. They are called once, on first use of the cut.
+    """
+
+    def __init__(self, variables):
+        self._variable_funcs = variables
+        self._variables = {}
+        self._masks = {}
+        self._windows = None
+        self._mask = None
+
+    def variable(self, name):
+        """
+        Return the cached variable of a cut.
+        """
+
+        if name not in self._variables:
+            self._variables[name] = self._variable_funcs[name]()
+        return self._variables[name]
+
+    def get_cut(self, name, window):
+        """
+        Return the mask of one cut.
+
+        Parameters
+        ----------
+        name : str
+            Name of the cut.
+        window : tuple
+            Lower and upper limits, both exclusive. None means no limit.
+        """
+
+        window = tuple(window)
+        cached = self._masks.get(name)
+        if cached is not None and cached[0] == window:
+            return np.unpackbits(cached[1], count=cached[2]).view(bool)
+
+        variable = self.variable(name)
+        lo, hi = window
+        mask = np.ones(variable.shape, dtype=bool)
+        if lo is not None:
+            mask &= variable > lo
+        if hi is not None:
+            mask &= variable < hi
+        self._masks[name] = (window, np.packbits(mask), mask.size)
+        return mask
+
+    def get_mask(self, windows):
+        """
+        Return the combined mask of the cuts.
+
+        Parameters
+        ----------
+        windows : dict
+            Window of each cut, keyed by cut name.
+
+        Returns
+        -------
+        rank-1 array of bool
+            Read-only array, it is shared by all calls with the same windows.
+        """
+
+        windows = {x: tuple(y) for x, y in windows.items()}
+        if self._mask is None or windows != self._windows:
+            mask = None
+            for name, window in windows.items():
+                cut = self.get_cut(name, window)
+                mask = cut if mask is None else mask & cut
+            mask.flags.writeable = False
+            self._windows = windows
+            self._mask = mask
+        return self._mask
+
+    def scan(self, windows_list, bin_index, bins, weights=None):
+        """
+        Histogram the selected events for many sets of windows at once.
+
+        The sets are grouped by all windows but those of one scan cut. In each
+        group the events passing the fixed cuts are sorted by the variable of
+        the scan cut, and cumulative histograms at the window edges give the
+        histogram of every window by a subtraction.
+
+        Parameters
+        ----------
+        windows_list : sequence of dict
+            Sets of windows, each like the argument of `CutCache.get_mask`.
+        bin_index : rank-1 array of int
+            Bin of each event, -1 for events outside of the histogram.
+        bins : int
+            Number of bins.
+        weights : rank-1 array of float, optional
+            Weight of each event.
+
+        Returns
+        -------
+        rank-2 array
+            One histogram for each set of windows.
+        """
+
+        windows_list = [{x: tuple(y)
+                         for x, y in windows.items()}
+                        for windows in windows_list]
+        names = list(windows_list[0].keys())
+
+        def _get_key(windows, scan_name):
+            return tuple((x, windows[x]) for x in names if x != scan_name)
+
+        # scan the cut which leaves the fewest groups of fixed windows
+        scan_name = min(
+            names,
+            key=lambda x: len({_get_key(y, x) for y in windows_list}),
+        )
+        groups = {}
+        for i, windows in enumerate(windows_list):
+            groups.setdefault(_get_key(windows, scan_name), []).append(i)
+
+        result = np.zeros((len(windows_list), bins))
+        for key, indices in groups.items():
+            base = bin_index >= 0
+            for name, window in key:
+                base &= self.get_cut(name, window)
+
+            variable = self.variable(scan_name)[base]
+            order = np.argsort(variable, kind='stable')
+            variable = variable[order]
+            index = bin_index[base][order]
+            weight = None if weights is None else weights[base][order]
+
+            starts, stops = [], []
+            for i in indices:
+                lo, hi = windows_list[i][scan_name]
+                starts.append(0 if lo is None else np.searchsorted(
+                    variable, lo, side='right'))
+                stops.append(
+                    len(variable) if hi is None else np.searchsorted(
+                        variable, hi, side='left'))
+
+            edges = np.unique(np.concatenate([[0], starts, stops]))
+            cumulative = np.zeros((len(edges), bins))
+            for j in range(1, len(edges)):
+                sl = slice(edges[j - 1], edges[j])
+                cumulative[j] = cumulative[j - 1] + np.bincount(
+                    index[sl],
+                    weights=None if weight is None else weight[sl],
+                    minlength=bins,
+                )
+
+            for i, start, stop in zip(indices, starts, stops):
+                if stop > start:
+                    result[i] = (cumulative[np.searchsorted(edges, stop)] -
+                                 cumulative[np.searchsorted(edges, start)])
+
+        if weights is None:
+            return np.rint(result).astype(np.int64)
+        return result
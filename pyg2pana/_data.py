@@ -1,11 +1,16 @@
 # Author: Chao Gu, 2018
 
 import re
-from os.path import exists, splitext
+from os.path import splitext
 
 import numpy as np
 
+from ._cuts import CutCache
+from ._hist import get_bin_index, histogram
+from ._reader import iter_root, read_root
 from ._run_db import RunDB
+from ._store import StoreWriter, load_store, save_store
+from .correction import get_weight
 
 __all__ = ['Data']
 
@@ -20,20 +25,45 @@ class Data():
     Parameters
     ----------
     files : sequence of str
-        If all files are rootfiles, root_numpy module is used to extract the
-        kinematics. If all files are npz files, they are directly loaded by
-        numpy.
+        If all files are rootfiles, uproot (or root_numpy, see `backend`) is
+        used to extract the kinematics. If all files are npz files, they
+        are directly loaded by numpy. A columnar store (a directory with
+        suffix .cols) is opened lazily, each column is memory-mapped on first
+        access.
+    backend : {None, 'uproot', 'root_numpy'}, optional
+        Rootfile reader, uproot is used if it is installed and `backend` is
+        None. The same selection is applied by both readers.
+    workers : int, optional
+        Number of threads to decompress baskets, uproot only.
     """
 
+    # keyword arguments of _load_root
+    _root_kwargs = ('start', 'stop', 'backend', 'workers')
+
     def __init__(self, files, *, db=None, refdb=None, **kwargs):
+        unknown = sorted(set(kwargs) - set(self._root_kwargs))
+        if unknown:
+            raise TypeError(
+                'unexpected keyword argument {!r}'.format(unknown[0]))
+
         self._cuts = None
+        self._nu = None
+        self._bin_cache = {}
+        self._weights = {}
+        self._weight_cache = {}
+        self._cut_cache = CutCache({
+            'y': lambda: self.gold.y,
+            't': lambda: self.rec.t,
+            'p': lambda: self.rec.p,
+            'sr': self._get_sr_r2,
+        })
 
         self._var_list = ['hel', 'bpm', 'sr', 'gold', 'rec']
 
         if not isinstance(files, (list, tuple)):
             files = [files]
 
-        self.run = int(re.findall(r'g2p_(\d+).*\.\D*', files[0])[0])
+        self.run = self._get_run(files[0])
 
         if db is None:
             self._db = RunDB(self.run)
@@ -49,6 +79,8 @@ class Data():
             self._load_root(files, **kwargs)
         elif all(ext == '.npz' for _, ext in map(splitext, files)):
             self._load_numpy(files[0])
+        elif all(ext == '.cols' for _, ext in map(splitext, files)):
+            self._load_store(files[0])
         else:
             raise ValueError('bad filename')
 
@@ -58,35 +90,110 @@ class Data():
         self.charge_plus = self._db.charge_plus
         self.charge_minus = self._db.charge_minus
 
-    def _load_root(self, files, *, start=None, stop=None, **_):
-        import sys
-        sys.argv.append('-b')
-        from ROOT import TChain
-        from root_numpy import tree2array
-
-        tree = TChain('T')
-        for file_ in files:
-            if exists(file_):
-                tree.Add(file_)
+    def _load_root(self, files, *, start=None, stop=None, backend=None,
+                   workers=None, **_):
+        groups, cut = self._root_vars(self.run, self._db)
+        branches = [x for _, var_vars, _ in groups for x in var_vars]
+        all_vars = read_root(
+            files,
+            branches,
+            cut,
+            start=start,
+            stop=stop,
+            backend=backend,
+            workers=workers,
+        )
+        for var, array in self._split(all_vars, groups).items():
+            setattr(self, var, array)
+
+    @classmethod
+    def iter_chunks(cls, files, chunk_size=1000000, *, db=None, backend=None,
+                    workers=None):
+        """
+        Iterate over rootfiles in chunks of events.
+
+        Parameters
+        ----------
+        files : sequence of str
+            Rootfiles of one run.
+        chunk_size : int
+            Number of entries read at a time, the number of selected events in
+            each chunk is smaller.
+        db : RunDB, optional
+            Run database record, loaded by run number if not given.
+        backend : {None, 'uproot', 'root_numpy'}
+            Rootfile reader, uproot is used if it is installed and `backend` is
+            None.
+        workers : int, optional
+            Number of threads to decompress baskets, uproot only.
+
+        Yields
+        ------
+        dict
+            Record arrays 'hel', 'bpm', 'sr', 'gold' and 'rec' of the chunk.
+        """
 
-        p0 = self._db.d1p * 1000
+        if not isinstance(files, (list, tuple)):
+            files = [files]
 
-        if self.run < 20000:
+        run = cls._get_run(files[0])
+        if db is None:
+            db = RunDB(run)
+
+        groups, cut = cls._root_vars(run, db)
+        branches = [x for _, var_vars, _ in groups for x in var_vars]
+        for all_vars in iter_root(
+                files,
+                branches,
+                cut,
+                chunk_size,
+                backend=backend,
+                workers=workers,
+        ):
+            yield cls._split(all_vars, groups)
+
+    @classmethod
+    def convert(cls, files, file_, chunk_size=1000000, **kwargs):
+        """
+        Convert rootfiles to a columnar store chunk by chunk.
+
+        Only one chunk is kept in memory, see `Data.iter_chunks` for the
+        parameters. Return the number of saved events, raise a ValueError
+        if no chunk is read, such as when none of the files exists.
+        """
+
+        with StoreWriter(file_) as writer:
+            chunk = None
+            for chunk in cls.iter_chunks(files, chunk_size, **kwargs):
+                writer.append(chunk)
+            if chunk is None:
+                raise ValueError('no rootfile could be read')
+        return writer.size
+
+    @staticmethod
+    def _get_run(file_):
+        return int(re.findall(r'g2p_(\d+).*\.\D*', file_)[0])
+
+    @staticmethod
+    def _root_vars(run, db):
+        p0 = db.d1p * 1000
+
+        if run < 20000:
             arm = 'L'
-            pr1_cut = 'L.prl1.e>{}'.format(self._db.pr1_cut * p0)
-            sum_cut = '(L.prl1.e+L.prl2.e)>{}'.format(self._db.sum_cut * p0)
+            pr1_vars = ('L.prl1.e', )
+            sum_vars = ('L.prl1.e', 'L.prl2.e')
         else:
             arm = 'R'
-            pr1_cut = 'R.ps.e>{}'.format(self._db.pr1_cut * p0)
-            sum_cut = '(R.ps.e+R.sh.e)>{}'.format(self._db.sum_cut * p0)
-        cut = '&&'.join([
-            'D{}.evtypebits!=0'.format(arm),
-            '{}.tr.n==1'.format(arm),
-            '{}.cer.asum_c>{}'.format(arm, self._db.cer_cut),
-            pr1_cut,
-            sum_cut,
-            '{}rb.bpmavail>0.5'.format(arm),
-        ])
+            pr1_vars = ('R.ps.e', )
+            sum_vars = ('R.ps.e', 'R.sh.e')
+        cut = [
+            (('D{}.evtypebits'.format(arm), ), '!=', 0),
+            (('{}.tr.n'.format(arm), ), '==', 1),
+            (('{}.cer.asum_c'.format(arm), ), '>', db.cer_cut),
+            (pr1_vars, '>', db.pr1_cut * p0),
+            (sum_vars, '>', db.sum_cut * p0),
+            (('{}rb.bpmavail'.format(arm), ), '>', 0.5),
+        ]
 
         hel_vars = ['hel.{}.{}'.format(arm, x) for x in ['hel_act', 'error']]
         bpm_vars = [
@@ -102,34 +209,25 @@ class Data():
             '{}.rec.{}'.format(arm, x) for x in ['x', 'th', 'y', 'ph', 'dp']
         ]
 
-        all_vars = tree2array(
-            tree,
-            hel_vars + bpm_vars + sr_vars + gold_vars + rec_vars,
-            cut,
-            start=start,
-            stop=stop,
-        )
+        groups = [
+            ('hel', hel_vars, 'val,err'),
+            ('bpm', bpm_vars, 'x,y,t,p'),
+            ('sr', sr_vars, 'x,y'),
+            ('gold', gold_vars, 't,y,p'),
+            ('rec', rec_vars, 'x,t,y,p,d'),
+        ]
 
-        self.hel = np.rec.fromarrays(
-            [all_vars[x] for x in hel_vars],
-            names='val,err',
-        )
-        self.bpm = np.rec.fromarrays(
-            [all_vars[x] for x in bpm_vars],
-            names='x,y,t,p',
-        )
-        self.sr = np.rec.fromarrays(
-            [all_vars[x] for x in sr_vars],
-            names='x,y',
-        )
-        self.gold = np.rec.fromarrays(
-            [all_vars[x] for x in gold_vars],
-            names='t,y,p',
-        )
-        self.rec = np.rec.fromarrays(
-            [all_vars[x] for x in rec_vars],
-            names='x,t,y,p,d',
-        )
+        return groups, cut
+
+    @staticmethod
+    def _split(all_vars, groups):
+        return {
+            var: np.rec.fromarrays(
+                [all_vars[x] for x in var_vars],
+                names=names,
+            )
+            for var, var_vars, names in groups
+        }
 
     def _load_numpy(self, file_):
         loaded = np.load(file_)
@@ -137,10 +235,24 @@ class Data():
         for var in self._var_list:
             setattr(self, var, loaded[var].view(np.recarray))
 
+    def _load_store(self, path):
+        groups, _ = load_store(path)
+
+        for var in self._var_list:
+            setattr(self, var, groups[var])
+
     def save(self, file_):
+        """
+        Save the kinematics to a compressed npz file, or to a columnar store
+        if the filename ends with .cols.
+        """
+
         if all(hasattr(self, x) for x in self._var_list):
             arrays = {x: getattr(self, x) for x in self._var_list}
-            np.savez_compressed(file_, **arrays)
+            if splitext(file_)[1] == '.cols':
+                save_store(file_, arrays)
+            else:
+                np.savez_compressed(file_, **arrays)
         else:
             raise ValueError('attributes do not exist')
 
@@ -148,26 +260,192 @@ class Data():
     def cuts(self):
         if self._cuts is None:
             return np.ones_like(self.rec.d, dtype=bool)
-        cut_y = ((self.gold.y > self._cuts['y'][0]) &
-                 (self.gold.y < self._cuts['y'][1]))
-        cut_t = ((self.rec.t > self._cuts['t'][0]) &
-                 (self.rec.t < self._cuts['t'][1]))
-        cut_p = ((self.rec.p > self._cuts['p'][0]) &
-                 (self.rec.p < self._cuts['p'][1]))
-        db = self._db if self._ref_db is None else self._ref_db
-        cut_sr = ((self.sr.x - db.slow_raster_cut_x)**2 +
-                  (self.sr.y - db.slow_raster_cut_y)**2 <
-                  (db.slow_raster_cut_r * self._cuts['sr'])**2)
-        return cut_y & cut_t & cut_p & cut_sr
+        return self._cut_cache.get_mask(self._get_windows(self._cuts))
 
     @cuts.setter
     def cuts(self, value):
         if (isinstance(value, dict)
                 and all(x in value.keys() for x in ['y', 't', 'p'])):
-            self._cuts = value
+            self._cuts = dict(value)
         else:
             raise ValueError('bad cuts')
 
+    def get_histogram(self, var, **kwargs):
+        """
+        Histogram a variable of the events passing the cuts.
+
+        The bin of each event is computed once for each variable and binning
+        and reused by later calls, with or without weights.
+
+        Parameters
+        ----------
+        var : str
+            Name of the histogrammed attribute, such as 'nu'.
+        bins : int
+            Number of uniform bins.
+        range : (float, float)
+            Lower and upper edges.
+        weights : rank-1 array of float, str or list of str, optional
+            Weight of each event (not only of the selected ones), or names of
+            weights set by `set_weight`, multiplied in one pass over the
+            selected events.
+
+        Returns
+        -------
+        rank-1 array
+            Same as the histogram of `numpy.histogram(var[cuts], ...)`.
+        """
+
+        bins = kwargs.get('bins')
+        bin_index = self._get_bin_index(var, bins, kwargs.get('range'))
+        weights = kwargs.get('weights')
+        if isinstance(weights, str) or (
+                isinstance(weights, (list, tuple)) and weights
+                and all(isinstance(x, str) for x in weights)):
+            columns, factor = self._get_weights(weights)
+            result = histogram(bin_index, bins, mask=self.cuts,
+                               weights=columns)
+            return result * factor
+        return histogram(
+            bin_index,
+            bins,
+            mask=self.cuts,
+            weights=None if weights is None else np.asarray(weights),
+        )
+
+    def set_weight(self, name, weight, var=None):
+        """
+        Set a named weight of the events, such as an acceptance correction,
+        the dilution or the prescale, to be used by `get_histogram`.
+
+        The weight of each event is computed on first use and cached, it is
+        computed again only when the weight or the variable changes.
+
+        Parameters
+        ----------
+        name : str
+            Name of the weight.
+        weight : float, sequence of float or callable
+            A constant factor, the coefficients of a polynomial of `var` (from
+            the highest order, see `correction.get_weight`), or a function of
+            `var`. None removes the weight.
+        var : str, optional
+            Group and field of the variable, such as 'rec.d'. It must be
+            given for a polynomial or a function, and not for a constant.
+
+        Examples
+        --------
+        >>> data.set_weight('acceptance', configs.corrections['l_22545000'],
+        ...                 'rec.d')
+        >>> data.set_weight('dilution', 0.17)
+        >>> data.get_histogram('nu', bins=1500, range=(-100, 1400),
+        ...                    weights=['acceptance', 'dilution'])
+        """
+
+        if weight is None:
+            self._weights.pop(name, None)
+            self._weight_cache.pop(name, None)
+            return
+
+        if np.isscalar(weight):
+            key = float(weight)
+        elif callable(weight):
+            key = weight
+        else:
+            key = tuple(float(x) for x in weight)
+        if np.isscalar(weight) and var is not None:
+            raise ValueError('constant weight with variable')
+        if not np.isscalar(weight) and var is None:
+            raise ValueError('weight without variable')
+        self._weights[name] = (key, var)
+
+    def _get_weights(self, names):
+        # the columns of the weights of each event and the product of the
+        # constant factors
+        if isinstance(names, str):
+            names = [names]
+
+        columns = []
+        factor = 1.0
+        for name in names:
+            key, var = self._weights[name]
+            if var is None:
+                factor *= key
+                continue
+
+            group, field = var.split('.')
+            values = getattr(self, group)
+            cached = self._weight_cache.get(name)
+            if (cached is None or cached[0] != (key, var)
+                    or cached[1] is not values):
+                column = getattr(values, field)
+                if callable(key):
+                    column = key(column)
+                else:
+                    column = get_weight(column, key)
+                column = np.asarray(column, dtype=np.float64)
+                column.flags.writeable = False
+                cached = ((key, var), values, column)
+                self._weight_cache[name] = cached
+            columns.append(cached[2])
+        return columns, factor
+
+    def scan_cuts(self, cuts_list, var, **kwargs):
+        """
+        Histogram a variable for many cut settings in one pass.
+
+        Parameters
+        ----------
+        cuts_list : sequence of dict
+            Cut settings, each one like the value assigned to `cuts`.
+        var : str
+            Name of the histogrammed attribute, such as 'nu'.
+        bins : int
+            Number of uniform bins.
+        range : (float, float)
+            Lower and upper edges.
+        weights : rank-1 array of float, optional
+            Weight of each event.
+
+        Returns
+        -------
+        rank-2 array
+            The histogram of `var[cuts]` for each cut setting.
+        """
+
+        bins = kwargs.get('bins')
+        bin_index = self._get_bin_index(var, bins, kwargs.get('range'))
+        return self._cut_cache.scan(
+            [self._get_windows(x) for x in cuts_list],
+            bin_index,
+            bins,
+            weights=kwargs.get('weights'),
+        )
+
+    def _get_bin_index(self, var, bins, range_):
+        # the variable is kept with the indices to notice when it changes
+        values = getattr(self, var)
+        key = (var, bins, tuple(range_))
+        cached = self._bin_cache.get(key)
+        if cached is None or cached[0] is not values:
+            cached = (values, get_bin_index(values, bins, range_))
+            self._bin_cache[key] = cached
+        return cached[1]
+
+    def _get_windows(self, cuts):
+        db = self._db if self._ref_db is None else self._ref_db
+        return {
+            'y': cuts['y'],
+            't': cuts['t'],
+            'p': cuts['p'],
+            'sr': (None, (db.slow_raster_cut_r * cuts['sr'])**2),
+        }
+
+    def _get_sr_r2(self):
+        db = self._db if self._ref_db is None else self._ref_db
+        return ((self.sr.x - db.slow_raster_cut_x)**2 +
+                (self.sr.y - db.slow_raster_cut_y)**2)
+
     @property
     def scale(self):
         return self._efficiency_prescale / (1 - self._db.deadtime)
@@ -193,4 +471,9 @@ class Data():
 
     @property
     def nu(self):
-        return self.e0 - self.p0 * (1 + self.rec.d)
+        key = (self.e0, self.p0)
+        if self._nu is None or self._nu[0] != key:
+            nu = self.e0 - self.p0 * (1 + self.rec.d)
+            nu.flags.writeable = False
+            self._nu = (key, nu)
+        return self._nu[1]
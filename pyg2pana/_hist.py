@@ -0,0 +1,83 @@
+# Author: Chao Gu, 2018
+
+import numpy as np
+
+__all__ = ['get_bin_index', 'histogram']
+
+
+def get_bin_index(x, bins, range):
+    """
+    Return the index of the uniform bin of each value.
+
+    The bins are the same as those of `numpy.histogram` with an integer
+    `bins`: the last bin includes its upper edge. Values outside of the range
+    and NaNs get index -1.
+
+    Parameters
+    ----------
+    x : array_like
+        Values.
+    bins : int
+        Number of bins.
+    range : (float, float)
+        Lower and upper edges.
+    """
+
+    first, last = float(range[0]), float(range[1])
+    edges = np.linspace(first, last, bins + 1)
+
+    x = np.asarray(x)
+    keep = (x >= first) & (x <= last)
+    x_keep = x[keep]
+
+    # same rounding corrections as numpy.histogram
+    index_keep = ((x_keep - first) * (bins / (last - first))).astype(np.intp)
+    index_keep[index_keep == bins] -= 1
+    index_keep[x_keep < edges[index_keep]] -= 1
+    increment = ((x_keep >= edges[index_keep + 1]) &
+                 (index_keep != bins - 1))
+    index_keep[increment] += 1
+
+    index = np.full(x.shape, -1, dtype=np.intp)
+    index[keep] = index_keep
+    return index
+
+
+def histogram(bin_index, bins, *, mask=None, weights=None):
+    """
+    Histogram events with precomputed bin indices.
+
+    Parameters
+    ----------
+    bin_index : rank-1 array of int
+        Bin of each event, see `get_bin_index`.
+    bins : int
+        Number of bins.
+    mask : rank-1 array of bool, optional
+        Selected events.
+    weights : rank-1 array of float or list of them, optional
+        Weight of each event. The product of a list of weights is only
+        computed for the selected events.
+
+    Returns
+    -------
+    rank-1 array
+        Counts (int) or sums of weights (float) in each bin.
+    """
+
+    select = bin_index >= 0
+    if mask is not None:
+        select &= mask
+    if isinstance(weights, list):
+        index = np.flatnonzero(select)
+        product = None
+        for weight in weights:
+            if product is None:
+                product = np.take(weight, index).astype(np.float64)
+            else:
+                product *= np.take(weight, index)
+        return np.bincount(bin_index[index], weights=product,
+                           minlength=bins)
+    if weights is not None:
+        weights = weights[select]
+    return np.bincount(bin_index[select], weights=weights, minlength=bins)
@@ -0,0 +1,267 @@
+# Author: Chao Gu, 2018
+
+import operator
+from os.path import exists
+
+import numpy as np
+
+__all__ = [
+    'apply_selection', 'count_entries', 'get_reader', 'iter_root',
+    'read_root', 'selection_string'
+]
+
+_ops = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+}
+
+
+def selection_string(selection):
+    """
+    Convert a selection to a ROOT selection expression.
+
+    Parameters
+    ----------
+    selection : sequence of tuple
+        Each item is (branches, operator, value), the sum of the branches is
+        compared to the value. All items are combined with logical and.
+    """
+
+    result = []
+    for branches, op, value in selection:
+        if len(branches) == 1:
+            lhs = branches[0]
+        else:
+            lhs = '({})'.format('+'.join(branches))
+        result.append('{}{}{}'.format(lhs, op, value))
+    return '&&'.join(result)
+
+
+def apply_selection(arrays, selection):
+    """
+    Evaluate a selection (see `selection_string`) on arrays keyed by branch.
+    """
+
+    mask = None
+    for branches, op, value in selection:
+        lhs = arrays[branches[0]]
+        for branch in branches[1:]:
+            lhs = lhs + arrays[branch]
+        result = _ops[op](lhs, value)
+        mask = result if mask is None else mask & result
+    return mask
+
+
+class _RootNumpyReader():
+    """
+    Read rootfiles with ROOT and root_numpy.
+    """
+
+    def __init__(self, **_):
+        pass
+
+    def count_entries(self, files, tree):
+        return int(self._get_chain(files, tree).GetEntries())
+
+    def iterate(self, files, branches, selection, tree, chunk_size, start,
+                stop):
+        from root_numpy import tree2array
+
+        chain = self._get_chain(files, tree)
+        n_entries = int(chain.GetEntries())
+        start = 0 if start is None else start
+        stop = n_entries if stop is None else min(stop, n_entries)
+        chunk_size = max(stop - start, 1) if chunk_size is None else chunk_size
+        for chunk_start in range(start, stop, chunk_size):
+            yield tree2array(
+                chain,
+                branches,
+                selection_string(selection),
+                start=chunk_start,
+                stop=min(chunk_start + chunk_size, stop),
+            )
+
+    @staticmethod
+    def _get_chain(files, tree):
+        import ROOT
+        ROOT.PyConfig.IgnoreCommandLineOptions = True
+        ROOT.gROOT.SetBatch(True)
+
+        chain = ROOT.TChain(tree)
+        for file_ in files:
+            if exists(file_):
+                chain.Add(file_)
+        return chain
+
+
+class _UprootReader():
+    """
+    Read rootfiles with uproot, no ROOT installation is needed.
+
+    Parameters
+    ----------
+    workers : int, optional
+        Number of threads to decompress and interpret baskets.
+    """
+
+    def __init__(self, *, workers=None, **_):
+        self.workers = workers
+
+    def count_entries(self, files, tree):
+        import uproot
+
+        result = 0
+        for file_ in files:
+            if exists(file_):
+                with uproot.open(file_) as root_file:
+                    result += root_file[tree].num_entries
+        return result
+
+    def iterate(self, files, branches, selection, tree, chunk_size, start,
+                stop):
+        import uproot
+
+        needed = list(branches)
+        for selection_branches, _, _ in selection:
+            needed += [x for x in selection_branches if x not in needed]
+
+        kwargs = {}
+        executor = None
+        if self.workers is not None:
+            executor = uproot.ThreadPoolExecutor(max_workers=self.workers)
+            kwargs['decompression_executor'] = executor
+            kwargs['interpretation_executor'] = executor
+
+        try:
+            yield from self._iterate(files, branches, needed, selection,
+                                     tree, chunk_size, start, stop, kwargs)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    @staticmethod
+    def _iterate(files, branches, needed, selection, tree, chunk_size, start,
+                 stop, kwargs):
+        import uproot
+
+        start = 0 if start is None else start
+        offset = 0
+        for file_ in files:
+            if not exists(file_):
+                continue
+            with uproot.open(file_) as root_file:
+                root_tree = root_file[tree]
+                n_entries = root_tree.num_entries
+                # entry range in this file
+                lo = max(start - offset, 0)
+                hi = n_entries if stop is None else min(stop - offset,
+                                                        n_entries)
+                offset += n_entries
+                if lo >= hi:
+                    continue
+                step_size = hi - lo if chunk_size is None else chunk_size
+                for arrays in root_tree.iterate(
+                        filter_name=needed,
+                        entry_start=lo,
+                        entry_stop=hi,
+                        step_size=step_size,
+                        library='np',
+                        **kwargs,
+                ):
+                    mask = apply_selection(arrays, selection)
+                    result = np.empty(
+                        np.count_nonzero(mask),
+                        dtype=[(x, arrays[x].dtype) for x in branches],
+                    )
+                    for branch in branches:
+                        result[branch] = arrays[branch][mask]
+                    yield result
+
+
+_readers = {
+    'root_numpy': _RootNumpyReader,
+    'uproot': _UprootReader,
+}
+
+
+def get_reader(backend=None, **kwargs):
+    """
+    Return a rootfile reader.
+
+    Parameters
+    ----------
+    backend : {None, 'uproot', 'root_numpy'}
+        Use uproot if it is installed and `backend` is None.
+    **kwargs
+        Options of the reader, `workers` for uproot.
+    """
+
+    if backend is None:
+        try:
+            import uproot  # noqa: F401
+        except ImportError:
+            backend = 'root_numpy'
+        else:
+            backend = 'uproot'
+
+    if backend not in _readers:
+        raise ValueError('unknown backend {}'.format(backend))
+
+    return _readers[backend](**kwargs)
+
+
+def count_entries(files, *, tree='T', backend=None, **kwargs):
+    """
+    Return the number of entries of a tree in rootfiles.
+    """
+
+    return get_reader(backend, **kwargs).count_entries(files, tree)
+
+
+def read_root(files, branches, selection, *, tree='T', start=None, stop=None,
+              backend=None, **kwargs):
+    """
+    Read branches of a tree in rootfiles into a structured array.
+
+    Parameters
+    ----------
+    files : sequence of str
+        Rootfiles, missing files are skipped.
+    branches : sequence of str
+        Names of the branches.
+    selection : sequence of tuple
+        Selection, see `selection_string`. Only selected entries are returned.
+    tree : str
+        Name of the tree.
+    start, stop : int, optional
+        Range of the entries (before selection) to read.
+    backend : {None, 'uproot', 'root_numpy'}
+        Reader backend, see `get_reader`.
+    """
+
+    chunks = list(
+        get_reader(backend, **kwargs).iterate(
+            files, branches, selection, tree, None, start, stop))
+    if not chunks:
+        return np.empty(0, dtype=[(x, 'f8') for x in branches])
+    return np.concatenate(chunks)
+
+
+def iter_root(files, branches, selection, chunk_size, *, tree='T',
+              backend=None, **kwargs):
+    """
+    Iterate over a tree in rootfiles in chunks of entries.
+
+    Parameters are the same as `read_root`, except that `chunk_size` entries
+    (before selection) are read at a time. Yield one structured array for each
+    chunk, chunks do not span files with the uproot backend.
+    """
+
+    reader = get_reader(backend, **kwargs)
+    for chunk in reader.iterate(files, branches, selection, tree, chunk_size,
+                                None, None):
+        yield chunk
@@ -1,9 +1,14 @@
 # Author: Chao Gu, 2018
 
+import os
 import sqlite3
 import time
+from collections import OrderedDict
 from datetime import datetime
 from os.path import dirname, join, realpath
+from urllib.request import pathname2url
+
+import numpy as np
 
 __all__ = ['RunDB']
 
@@ -12,6 +17,14 @@ class RunDB():
     """
     Run Database Interface
     ----------------------
+    All columns of a run are fetched with a single query on a read-only
+    connection shared by the process. Decoded records are kept in a LRU cache
+    keyed by run number, use `RunDB.preload` to fill it for a run list.
+
+    Parameters
+    ----------
+    run : int
+        Run number.
     """
 
     variables = [
@@ -87,16 +100,195 @@ class RunDB():
         ('slow_raster_cut_r', 'rSR', 'float'),
     ]
 
+    _dtypes = {'int': 'i8', 'float': 'f8', 'string': 'O', 'time': 'i8'}
+    _missing = {'int': -1, 'float': np.nan, 'string': None, 'time': -1}
+
+    db_file = join(dirname(realpath(__file__)), 'g2p.db')
+    cache_size = 1024
+
+    _con = None
+    _con_key = None
+    _records = OrderedDict()
+
     def __init__(self, run):
         if not isinstance(run, int):
             raise TypeError("run must be type 'int'")
 
-        db_file = join(dirname(realpath(__file__)), 'g2p.db')
-        self._con = sqlite3.connect(db_file)
-        self._cur = self._con.cursor()
+        for key, value in self._get_record(run).items():
+            setattr(self, key, value)
+
+    @classmethod
+    def preload(cls, runs):
+        """
+        Load the records of many runs into the cache.
+
+        Parameters
+        ----------
+        runs : sequence of int
+            Run numbers, all records are fetched with one query per table.
+        """
+
+        for run, record in cls._fetch(runs).items():
+            cls._cache_record(run, record)
+
+    @classmethod
+    def load_table(cls, arm):
+        """
+        Load the whole run table of one arm as a structured array.
+
+        Parameters
+        ----------
+        arm : {'L', 'R'}
+            Spectrometer arm.
+
+        Returns
+        -------
+        recarray
+            One row per run sorted by run number, see `RunDB.snapshot`.
+        """
+
+        if arm not in ('L', 'R'):
+            raise ValueError("arm must be 'L' or 'R'")
+
+        command = 'Select * from AnaInfo{} order by RunNumber'.format(arm)
+        records = {}
+        for row in cls._query(command, ()):
+            records[int(row['runnumber'])] = cls._decode(row)
+
+        return cls._to_array(list(records.keys()), records)
+
+    @classmethod
+    def snapshot(cls, runs):
+        """
+        Load the records of many runs as a structured array.
+
+        Parameters
+        ----------
+        runs : sequence of int
+            Run numbers.
+
+        Returns
+        -------
+        recarray
+            One row per run in the given order, with a field `run` and one
+            field for each entry of `RunDB.variables`. Missing values are NaN
+            for floats, -1 for integers and times and None for strings.
+        """
+
+        runs = list(runs)
+        records = {x: cls._records[x] for x in runs if x in cls._records}
+        records.update(cls._fetch([x for x in runs if x not in records]))
+        return cls._to_array(runs, records)
 
-        for variable in self.__class__.variables:
-            value = self._search(variable[1], run)
+    @staticmethod
+    def get_scale(table, ref=None, deadtime='deadtime'):
+        """
+        Calculate the scale factors of `Data` for many runs at once.
+
+        Parameters
+        ----------
+        table : recarray
+            Run records returned by `RunDB.snapshot` or `RunDB.load_table`.
+        ref : recarray, optional
+            Records to take the efficiencies from, default is `table`.
+        deadtime : {'deadtime', 'deadtime_plus', 'deadtime_minus'}
+            Deadtime used for the correction.
+        """
+
+        if ref is None:
+            ref = table
+        efficiency = ref['one_track_eff'] / ref['all_track_eff']
+        efficiency = efficiency * ref['trigger_eff']
+        efficiency = efficiency * ref['cer_eff'] * ref['pr_eff']
+        prescale = np.where(table['run'] < 20000, table['ps3'], table['ps1'])
+        return prescale / efficiency / (1 - table[deadtime])
+
+    @classmethod
+    def clear_cache(cls):
+        cls._records.clear()
+
+    @classmethod
+    def _get_record(cls, run):
+        if run in cls._records:
+            cls._records.move_to_end(run)
+            return cls._records[run]
+
+        command = 'Select * from {} where RunNumber = ?'.format(
+            cls._table(run))
+        rows = cls._query(command, (run, ))
+        record = cls._decode(rows[0]) if rows else {}
+        cls._cache_record(run, record)
+        return record
+
+    @classmethod
+    def _fetch(cls, runs):
+        tables = {}
+        for run in runs:
+            if not isinstance(run, int):
+                raise TypeError("run must be type 'int'")
+            tables.setdefault(cls._table(run), []).append(run)
+
+        records = {}
+        for table, table_runs in tables.items():
+            # stay below the default limit of sqlite host parameters
+            for i in range(0, len(table_runs), 500):
+                chunk = table_runs[i:i + 500]
+                command = 'Select * from {} where RunNumber in ({})'.format(
+                    table, ','.join('?' * len(chunk)))
+                for row in cls._query(command, chunk):
+                    records[int(row['runnumber'])] = cls._decode(row)
+            for run in table_runs:
+                records.setdefault(run, {})
+        return records
+
+    @classmethod
+    def _to_array(cls, runs, records):
+        dtype = [('run', 'i8')]
+        dtype += [(x[0], cls._dtypes[x[2]]) for x in cls.variables]
+        result = np.empty(len(runs), dtype=dtype).view(np.recarray)
+        result['run'] = runs
+        for name, _, type_ in cls.variables:
+            missing = cls._missing[type_]
+            column = [records[x].get(name) for x in runs]
+            result[name] = [missing if x is None else x for x in column]
+        return result
+
+    @classmethod
+    def _cache_record(cls, run, record):
+        cls._records[run] = record
+        cls._records.move_to_end(run)
+        while len(cls._records) > cls.cache_size:
+            cls._records.popitem(last=False)
+
+    @classmethod
+    def _connect(cls):
+        # one read-only connection per process, reopened after fork or when
+        # the database file is changed
+        key = (os.getpid(), cls.db_file)
+        if RunDB._con is None or RunDB._con_key != key:
+            if RunDB._con_key is not None and RunDB._con_key[1] != key[1]:
+                RunDB._records.clear()
+            uri = 'file:{}?mode=ro'.format(pathname2url(cls.db_file))
+            RunDB._con = sqlite3.connect(
+                uri, uri=True, check_same_thread=False)
+            RunDB._con_key = key
+        return RunDB._con
+
+    @classmethod
+    def _query(cls, command, parameters):
+        con = cls._connect()
+        try:
+            cur = con.execute(command, parameters)
+        except sqlite3.OperationalError:
+            return []
+        columns = [x[0].lower() for x in cur.description]
+        return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+    @classmethod
+    def _decode(cls, row):
+        record = {}
+        for variable in cls.variables:
+            value = row.get(variable[1].lower())
             if value is None:
                 continue
 
@@ -112,17 +304,9 @@ class RunDB():
                     value = int(time.mktime(value.timetuple()))
             except (TypeError, ValueError):
                 value = None
-            setattr(self, variable[0], value)
-
-    def _search(self, field, run):
-        table = 'AnaInfoR' if run > 20000 else 'AnaInfoL'
-        command = 'Select {} from {}'.format(field, table)
-        condition = 'where {} = {}'.format('RunNumber', run)
-
-        try:
-            self._cur.execute(command + ' ' + condition)
-            r = self._cur.fetchone()
-        except sqlite3.OperationalError:
-            return None
+            record[variable[0]] = value
+        return record
 
-        return r[0] if r is not None else None
+    @staticmethod
+    def _table(run):
+        return 'AnaInfoR' if run > 20000 else 'AnaInfoL'
@@ -0,0 +1,306 @@
+# Author: Chao Gu, 2018
+
+from os.path import exists, join, splitext
+
+import numpy as np
+
+from ._cuts import CutCache
+from ._data import Data
+from ._hist import get_bin_index, histogram
+from ._run_db import RunDB
+from ._store import StoreWriter, load_store
+
+__all__ = ['RunSet']
+
+
+class RunSet():
+    """
+    Run Set
+    -------
+    Events of many runs of one setting, concatenated into one set of columns
+    with the index of the run of each event. The run records are loaded with
+    one query, and cuts, histograms and yields of all runs are computed in
+    one pass.
+
+    Parameters
+    ----------
+    files : sequence of str
+        One npz file or columnar store per run, named like those of `Data`,
+        or a single store written by `RunSet.build` or `RunSet.save`.
+    refdb : RunDB, optional
+        Reference run for the efficiencies and the slow raster cut, same as
+        in `Data`. By default each run uses its own records.
+    """
+
+    _var_list = ['hel', 'bpm', 'sr', 'gold', 'rec']
+
+    def __init__(self, files, *, refdb=None):
+        self._cuts = None
+        self._nu = None
+        self._bin_cache = {}
+        self._cut_cache = CutCache({
+            'y': lambda: self.gold.y,
+            't': lambda: self.rec.t,
+            'p': lambda: self.rec.p,
+            'sr': self._get_sr_r2,
+        })
+
+        if not isinstance(files, (list, tuple)):
+            files = [files]
+
+        if len(files) == 1 and self._is_run_set(files[0]):
+            groups, attrs = load_store(files[0])
+            self.runs = np.array(attrs['runs'], dtype=np.int64)
+        else:
+            groups = self._concatenate(files)
+            self.runs = np.array([Data._get_run(x) for x in files],
+                                 dtype=np.int64)
+        for var in self._var_list:
+            setattr(self, var, groups[var])
+        self.run_index = groups['run']['index']
+
+        self.table = RunDB.snapshot(self.runs.tolist())
+        self._ref_table = self.table
+        if refdb is not None:
+            self._ref_table = self.table.copy()
+            for name, _, _ in RunDB.variables:
+                if hasattr(refdb, name):
+                    self._ref_table[name] = getattr(refdb, name)
+
+        self.e0 = self.table.beam_energy
+        self.p0 = self.table.d1p * 1000
+        self.charge = self.table.charge
+        self.charge_plus = self.table.charge_plus
+        self.charge_minus = self.table.charge_minus
+
+    @classmethod
+    def build(cls, files, file_, **kwargs):
+        """
+        Concatenate the files of many runs into one columnar store, run by
+        run, and open it.
+
+        Parameters
+        ----------
+        files : sequence of str
+            One npz file or columnar store per run.
+        file_ : str
+            Directory of the store.
+        **kwargs
+            Arguments of `RunSet`.
+        """
+
+        runs = []
+        with StoreWriter(file_) as writer:
+            for i, (run, groups) in enumerate(cls._iter_runs(files)):
+                size = len(groups['rec'])
+                groups['run'] = np.rec.fromarrays(
+                    [np.full(size, i, dtype=np.int32)],
+                    names='index',
+                )
+                writer.append(groups)
+                runs.append(run)
+            writer.attrs['runs'] = runs
+        return cls(file_, **kwargs)
+
+    def save(self, file_):
+        """
+        Save the events and the run index to a columnar store.
+        """
+
+        groups = {x: getattr(self, x) for x in self._var_list}
+        groups['run'] = np.rec.fromarrays([self.run_index], names='index')
+        with StoreWriter(file_) as writer:
+            writer.append(groups)
+            writer.attrs['runs'] = self.runs.tolist()
+
+    @property
+    def cuts(self):
+        if self._cuts is None:
+            return np.ones_like(self.run_index, dtype=bool)
+        return self._cut_cache.get_mask(self._get_windows(self._cuts))
+
+    @cuts.setter
+    def cuts(self, value):
+        if (isinstance(value, dict)
+                and all(x in value.keys() for x in ['y', 't', 'p'])):
+            self._cuts = dict(value)
+        else:
+            raise ValueError('bad cuts')
+
+    @property
+    def scale(self):
+        return RunDB.get_scale(self.table, ref=self._ref_table)
+
+    @property
+    def scale_plus(self):
+        return RunDB.get_scale(self.table, ref=self._ref_table,
+                               deadtime='deadtime_plus')
+
+    @property
+    def scale_minus(self):
+        return RunDB.get_scale(self.table, ref=self._ref_table,
+                               deadtime='deadtime_minus')
+
+    @property
+    def nu(self):
+        if self._nu is None:
+            e0 = self.e0[self.run_index]
+            p0 = self.p0[self.run_index]
+            nu = e0 - p0 * (1 + self.rec.d)
+            nu.flags.writeable = False
+            self._nu = nu
+        return self._nu
+
+    def get_histogram(self, var, *, per_run=False, **kwargs):
+        """
+        Histogram a variable of the events passing the cuts.
+
+        Parameters
+        ----------
+        var : str
+            Name of the histogrammed attribute, such as 'nu'.
+        per_run : bool
+            Return one histogram for each run.
+        bins : int
+            Number of uniform bins.
+        range : (float, float)
+            Lower and upper edges.
+        weights : rank-1 array of float, optional
+            Weight of each event.
+
+        Returns
+        -------
+        rank-1 or rank-2 array
+            Histogram of all runs, or of each run with `per_run`.
+        """
+
+        bins = kwargs.get('bins')
+        bin_index = self._get_bin_index(var, bins, kwargs.get('range'))
+        if not per_run:
+            return histogram(
+                bin_index,
+                bins,
+                mask=self.cuts,
+                weights=kwargs.get('weights'),
+            )
+
+        n_runs = len(self.runs)
+        index = np.where(bin_index >= 0, self.run_index * bins + bin_index,
+                         -1)
+        result = histogram(
+            index,
+            n_runs * bins,
+            mask=self.cuts,
+            weights=kwargs.get('weights'),
+        )
+        return result.reshape(n_runs, bins)
+
+    def get_yield(self, var, **kwargs):
+        """
+        Charge-weighted yield of a variable summed over all runs.
+
+        Each event is weighted by the scale factor of its run (and by
+        `weights`), and the sum is divided by the total charge.
+
+        Parameters
+        ----------
+        var : str
+            Name of the histogrammed attribute, such as 'nu'.
+        bins : int
+            Number of uniform bins.
+        range : (float, float)
+            Lower and upper edges.
+        weights : rank-1 array of float, optional
+            Weight of each event.
+        deadtime : {'deadtime', 'deadtime_plus', 'deadtime_minus'}
+            Deadtime used for the scale factors.
+        charge : {'charge', 'charge_plus', 'charge_minus'}
+            Charge used for the normalization.
+
+        Returns
+        -------
+        yield_, error : rank-1 array of float
+            Yield and its statistical error in each bin.
+        """
+
+        deadtime = kwargs.get('deadtime', 'deadtime')
+        charge = getattr(self, kwargs.get('charge', 'charge'))
+        scale = RunDB.get_scale(self.table, ref=self._ref_table,
+                                deadtime=deadtime)
+
+        weights = scale[self.run_index]
+        if kwargs.get('weights') is not None:
+            weights = weights * kwargs['weights']
+
+        bins = kwargs.get('bins')
+        bin_index = self._get_bin_index(var, bins, kwargs.get('range'))
+        mask = self.cuts
+        total = histogram(bin_index, bins, mask=mask, weights=weights)
+        total2 = histogram(bin_index, bins, mask=mask, weights=weights**2)
+
+        norm = np.sum(charge)
+        return total / norm, np.sqrt(total2) / norm
+
+    def _get_bin_index(self, var, bins, range_):
+        key = (var, bins, tuple(range_))
+        values = getattr(self, var)
+        cached = self._bin_cache.get(key)
+        if cached is None or cached[0] is not values:
+            cached = (values, get_bin_index(values, bins, range_))
+            self._bin_cache[key] = cached
+        return cached[1]
+
+    def _get_windows(self, cuts):
+        return {
+            'y': cuts['y'],
+            't': cuts['t'],
+            'p': cuts['p'],
+            'sr': (None, cuts['sr']**2),
+        }
+
+    def _get_sr_r2(self):
+        # distance to the center of the cut of each run, in units of the
+        # radius of the cut
+        ref = self._ref_table
+        x = ref.slow_raster_cut_x[self.run_index]
+        y = ref.slow_raster_cut_y[self.run_index]
+        r = ref.slow_raster_cut_r[self.run_index]
+        return ((self.sr.x - x)**2 + (self.sr.y - y)**2) / r**2
+
+    @staticmethod
+    def _is_run_set(file_):
+        if splitext(file_)[1] != '.cols' or not exists(
+                join(file_, 'meta.json')):
+            return False
+        _, attrs = load_store(file_)
+        return 'runs' in attrs
+
+    @classmethod
+    def _iter_runs(cls, files):
+        for file_ in files:
+            if splitext(file_)[1] == '.npz':
+                loaded = np.load(file_)
+                groups = {x: loaded[x] for x in cls._var_list}
+            elif splitext(file_)[1] == '.cols':
+                loaded, _ = load_store(file_)
+                groups = {x: loaded[x] for x in cls._var_list}
+            else:
+                raise ValueError('bad filename')
+            yield Data._get_run(file_), groups
+
+    @classmethod
+    def _concatenate(cls, files):
+        parts = {x: [] for x in cls._var_list + ['run']}
+        for i, (_, groups) in enumerate(cls._iter_runs(files)):
+            for var in cls._var_list:
+                parts[var].append(np.asarray(groups[var]))
+            parts['run'].append(
+                np.full(len(groups['rec']), i, dtype=np.int32))
+
+        result = {
+            x: np.concatenate(parts[x]).view(np.recarray)
+            for x in cls._var_list
+        }
+        result['run'] = np.rec.fromarrays([np.concatenate(parts['run'])],
+                                          names='index')
+        return result
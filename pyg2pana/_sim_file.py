@@ -1,11 +1,16 @@
 # Author: Chao Gu, 2018
 
 import re
-from os.path import exists, splitext
+from os.path import splitext
 
 import numpy as np
 
+from ._acceptance import Acceptance
+from ._cuts import CutCache
+from ._hist import get_bin_index, histogram
+from ._reader import count_entries, iter_root, read_root
 from ._run_db import RunDB
+from ._store import StoreWriter, load_store, save_store
 
 __all__ = ['SimFile']
 
@@ -20,13 +25,35 @@ class SimFile():
     Parameters
     ----------
     files : sequence of str
-        If all files are rootfiles, root_numpy module is used to extract the
-        kinematics. If all files are npz files, they are directly loaded by
-        numpy.
+        If all files are rootfiles, uproot (or root_numpy, see `backend`) is
+        used to extract the kinematics. If all files are npz files, they
+        are directly loaded by numpy. A columnar store (a directory with
+        suffix .cols) is opened lazily, each column is memory-mapped on first
+        access.
+    backend : {None, 'uproot', 'root_numpy'}, optional
+        Rootfile reader, uproot is used if it is installed and `backend` is
+        None. The same selection is applied by both readers.
+    workers : int, optional
+        Number of threads to decompress baskets, uproot only.
     """
 
+    # keyword arguments of _load_root
+    _root_kwargs = ('start', 'stop', 'backend', 'workers')
+
     def __init__(self, files, *, db=None, refdb=None, **kwargs):
+        unknown = sorted(set(kwargs) - set(self._root_kwargs))
+        if unknown:
+            raise TypeError(
+                'unexpected keyword argument {!r}'.format(unknown[0]))
+
         self._cuts = None
+        self._nu = None
+        self._bin_cache = {}
+        self._cut_cache = CutCache({
+            't': lambda: self.rec.t,
+            'p': lambda: self.rec.p,
+            'sr': self._get_sr_r2,
+        })
 
         self._var_list = ['bpm', 'rec', 'xs']
 
@@ -49,6 +76,8 @@ class SimFile():
             self._load_root(files, **kwargs)
         elif all(ext == '.npz' for _, ext in map(splitext, files)):
             self._load_numpy(files[0])
+        elif all(ext == '.cols' for _, ext in map(splitext, files)):
+            self._load_store(files[0])
         else:
             raise ValueError('bad filename')
 
@@ -57,45 +86,117 @@ class SimFile():
 
         self.range = {'d': 0.08, 't': 0.12, 'p': 0.08}
 
-    def _load_root(self, files, *, start=None, stop=None, **_):
-        import sys
-        sys.argv.append('-b')
-        from ROOT import TChain
-        from root_numpy import tree2array
+    def _load_root(self, files, *, start=None, stop=None, backend=None,
+                   workers=None, **_):
+        self.n = count_entries(files, backend=backend)
+
+        groups, cut = self._root_vars()
+        branches = [x for _, var_vars, _ in groups for x in var_vars]
+        all_vars = read_root(
+            files,
+            branches,
+            cut,
+            start=start,
+            stop=stop,
+            backend=backend,
+            workers=workers,
+        )
+        for var, array in self._split(all_vars, groups).items():
+            setattr(self, var, array)
+
+    @classmethod
+    def iter_chunks(cls, files, chunk_size=1000000, *, backend=None,
+                    workers=None):
+        """
+        Iterate over rootfiles in chunks of events.
+
+        Parameters
+        ----------
+        files : sequence of str
+            Rootfiles of one run.
+        chunk_size : int
+            Number of entries read at a time, the number of selected events in
+            each chunk is smaller.
+        backend : {None, 'uproot', 'root_numpy'}
+            Rootfile reader, uproot is used if it is installed and `backend` is
+            None.
+        workers : int, optional
+            Number of threads to decompress baskets, uproot only.
 
-        tree = TChain('T')
-        for file_ in files:
-            if exists(file_):
-                tree.Add(file_)
+        Yields
+        ------
+        dict
+            Record arrays 'bpm', 'rec' and 'xs' of the chunk.
+        """
+
+        if not isinstance(files, (list, tuple)):
+            files = [files]
 
-        self.n = tree.GetEntries()
+        groups, cut = cls._root_vars()
+        branches = [x for _, var_vars, _ in groups for x in var_vars]
+        for all_vars in iter_root(
+                files,
+                branches,
+                cut,
+                chunk_size,
+                backend=backend,
+                workers=workers,
+        ):
+            yield cls._split(all_vars, groups)
 
-        cut = 'isgood>0.5'
+    @classmethod
+    def convert(cls, files, file_, chunk_size=1000000, *, backend=None,
+                workers=None):
+        """
+        Convert rootfiles to a columnar store chunk by chunk.
+
+        Only one chunk is kept in memory, see `SimFile.iter_chunks` for the
+        parameters. Return the number of saved events, raise a ValueError
+        if no chunk is read, such as when none of the files exists.
+        """
+
+        if not isinstance(files, (list, tuple)):
+            files = [files]
+
+        with StoreWriter(file_) as writer:
+            chunk = None
+            for chunk in cls.iter_chunks(
+                    files,
+                    chunk_size,
+                    backend=backend,
+                    workers=workers,
+            ):
+                writer.append(chunk)
+            if chunk is None:
+                raise ValueError('no rootfile could be read')
+            writer.attrs['n'] = count_entries(files, backend=backend)
+        return writer.size
+
+    @staticmethod
+    def _root_vars():
+        cut = [(('isgood', ), '>', 0.5)]
 
         bpm_vars = ['bpm.l_x', 'bpm.l_y', 'bpm.l_t', 'bpm.l_p']
         rec_vars = ['rec.x', 'rec.t', 'rec.y', 'rec.p', 'rec.d']
         xs_vars = ['phys.react.xs']
 
-        all_vars = tree2array(
-            tree,
-            bpm_vars + rec_vars + xs_vars,
-            cut,
-            start=start,
-            stop=stop,
-        )
+        groups = [
+            ('bpm', bpm_vars, 'x,y,t,p'),
+            ('rec', rec_vars, 'x,t,y,p,d'),
+            ('xs', xs_vars, 'val'),
+        ]
 
-        self.bpm = np.rec.fromarrays(
-            [all_vars[x] for x in bpm_vars],
-            names='x,y,t,p',
-        )
-        self.rec = np.rec.fromarrays(
-            [all_vars[x] for x in rec_vars],
-            names='x,t,y,p,d',
-        )
-        self.xs = np.rec.fromarrays(
-            [all_vars[x] for x in xs_vars],
-            names='val',
-        )
+        return groups, cut
+
+    @staticmethod
+    def _split(all_vars, groups):
+        return {
+            var: np.rec.fromarrays(
+                [all_vars[x] for x in var_vars],
+                names=names,
+            )
+            for var, var_vars, names in groups
+        }
 
     def _load_numpy(self, file_):
         loaded = np.load(file_)
@@ -103,11 +204,25 @@ class SimFile():
             setattr(self, var, loaded[var].view(np.recarray))
         self.n = int(loaded['n'][0])
 
+    def _load_store(self, path):
+        groups, attrs = load_store(path)
+        for var in self._var_list:
+            setattr(self, var, groups[var])
+        self.n = attrs['n']
+
     def save(self, file_):
+        """
+        Save the kinematics to a compressed npz file, or to a columnar store
+        if the filename ends with .cols.
+        """
+
         if all(hasattr(self, x) for x in self._var_list):
             arrays = {x: getattr(self, x) for x in self._var_list}
-            n = np.array([self.n])
-            np.savez_compressed(file_, **arrays, n=n)
+            if splitext(file_)[1] == '.cols':
+                save_store(file_, arrays, attrs={'n': int(self.n)})
+            else:
+                n = np.array([self.n])
+                np.savez_compressed(file_, **arrays, n=n)
         else:
             raise ValueError('attributes do not exist')
 
@@ -115,37 +230,121 @@ class SimFile():
     def cuts(self):
         if self._cuts is None:
             return np.ones_like(self.rec.d, dtype=bool)
-        cut_t = ((self.rec.t > self._cuts['t'][0]) &
-                 (self.rec.t < self._cuts['t'][1]))
-        cut_p = ((self.rec.p > self._cuts['p'][0]) &
-                 (self.rec.p < self._cuts['p'][1]))
-        db = self._db if self._ref_db is None else self._ref_db
-        cut_sr = ((self.bpm.x - db.sim_cut_x * 1e-3)**2 +
-                  (self.bpm.y - db.sim_cut_y * 1e-3)**2 <
-                  (db.sim_cut_r * self._cuts['sr'] * 1e-3)**2)
-        return cut_t & cut_p & cut_sr
+        return self._cut_cache.get_mask(self._get_windows(self._cuts))
 
     @cuts.setter
     def cuts(self, value):
         if (isinstance(value, dict)
                 and all(x in value.keys() for x in ['t', 'p'])):
-            self._cuts = value
+            self._cuts = dict(value)
         else:
             raise ValueError('bad cuts')
 
+    def scan_acceptance(self, cuts_list, var, **kwargs):
+        """
+        Calculate the acceptance for many cut settings in one pass.
+
+        Parameters
+        ----------
+        cuts_list : sequence of dict
+            Cut settings, each one like the value assigned to `cuts`.
+        var : str
+            Name of the histogrammed attribute, such as 'nu'.
+        bins : int
+            Number of uniform bins.
+        range : (float, float)
+            Lower and upper edges.
+
+        Returns
+        -------
+        rank-2 array
+            The result of `get_acceptance` for each cut setting.
+        """
+
+        bins = kwargs.get('bins')
+        bin_index = self._get_bin_index(var, bins, kwargs.get('range'))
+        hists = self._cut_cache.scan(
+            [self._get_windows(x) for x in cuts_list],
+            bin_index,
+            bins,
+        )
+        return np.array([
+            Acceptance(
+                var,
+                bins,
+                kwargs.get('range'),
+                cuts,
+                self.p0,
+                self.range,
+                counts=hist,
+                n=self.n,
+            ).values for cuts, hist in zip(cuts_list, hists)
+        ])
+
+    def _get_bin_index(self, var, bins, range_):
+        # the variable is kept with the indices to notice when it changes
+        values = getattr(self, var)
+        key = (var, bins, tuple(range_))
+        cached = self._bin_cache.get(key)
+        if cached is None or cached[0] is not values:
+            cached = (values, get_bin_index(values, bins, range_))
+            self._bin_cache[key] = cached
+        return cached[1]
+
+    def _get_windows(self, cuts):
+        db = self._db if self._ref_db is None else self._ref_db
+        return {
+            't': cuts['t'],
+            'p': cuts['p'],
+            'sr': (None, (db.sim_cut_r * cuts['sr'] * 1e-3)**2),
+        }
+
+    def _get_sr_r2(self):
+        db = self._db if self._ref_db is None else self._ref_db
+        return ((self.bpm.x - db.sim_cut_x * 1e-3)**2 +
+                (self.bpm.y - db.sim_cut_y * 1e-3)**2)
+
     @property
     def nu(self):
-        return self.e0 - self.p0 * (1 + self.rec.d)
+        key = (self.e0, self.p0)
+        if self._nu is None or self._nu[0] != key:
+            nu = self.e0 - self.p0 * (1 + self.rec.d)
+            nu.flags.writeable = False
+            self._nu = (key, nu)
+        return self._nu[1]
 
-    def get_acceptance(self, var, **kwargs):
-        vv = getattr(self, var)
-        hist, _ = np.histogram(
-            vv[self.cuts],
-            bins=kwargs.get('bins'),
-            range=kwargs.get('range'),
+    def get_histogram(self, var, **kwargs):
+        """
+        Histogram a variable of the events passing the cuts, see
+        `Data.get_histogram`.
+        """
+
+        bins = kwargs.get('bins')
+        bin_index = self._get_bin_index(var, bins, kwargs.get('range'))
+        return histogram(
+            bin_index,
+            bins,
+            mask=self.cuts,
+            weights=kwargs.get('weights'),
         )
-        ave = np.average(hist[hist > 0])
-        hist[hist < 0.8 * ave] = np.iinfo(np.int64).max
-        norm = self.n / (
-            self.range['t'] * self.range['p'] * self.range['d'] * self.p0)
-        return hist / norm
+
+    def get_acceptance(self, var, **kwargs):
+        """
+        Return the normalized acceptance, see `Acceptance.values`. Use
+        `Acceptance` directly to merge or save it. The acceptance counts
+        events, so `weights` is not accepted.
+        """
+
+        if kwargs.get('weights') is not None:
+            raise ValueError('acceptance of weighted events')
+
+        return Acceptance(
+            var,
+            kwargs.get('bins'),
+            kwargs.get('range'),
+            self._cuts,
+            self.p0,
+            self.range,
+            counts=self.get_histogram(var, **kwargs),
+            n=self.n,
+        ).values
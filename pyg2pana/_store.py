@@ -0,0 +1,229 @@
+# Author: Chao Gu, 2018
+
+import json
+import struct
+from os import makedirs, remove
+from os.path import exists, join
+
+import numpy as np
+
+__all__ = ['Columns', 'StoreWriter', 'load_store', 'save_store']
+
+_format_version = 1
+_header_size = 128
+
+
+class Columns():
+    """
+    Lazy Record Array
+    -----------------
+    A group of columns saved as one npy file per column. Each column is
+    memory-mapped on first access, so only the columns actually used are ever
+    read from disk. Fields are accessed like those of a recarray, and indexing
+    with anything else than a field name returns a recarray.
+
+    Parameters
+    ----------
+    path : str
+        Directory of the store.
+    group : str
+        Name of the group.
+    names : sequence of str
+        Names of the columns.
+    size : int
+        Length of the columns.
+    """
+
+    def __init__(self, path, group, names, size):
+        self._path = path
+        self._group = group
+        self._names = tuple(names)
+        self._size = size
+        self._columns = {}
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name not in self._names:
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key not in self._names:
+                raise KeyError(key)
+            if key not in self._columns:
+                file_ = join(self._path, '{}.{}.npy'.format(self._group, key))
+                # empty files can not be memory-mapped
+                mmap_mode = 'r' if self._size > 0 else None
+                self._columns[key] = np.load(file_, mmap_mode=mmap_mode)
+            return self._columns[key]
+        return np.rec.fromarrays(
+            [self[x][key] for x in self._names],
+            names=','.join(self._names),
+        )
+
+    def __len__(self):
+        return self._size
+
+    def __array__(self, dtype=None, copy=None):
+        result = self[...]
+        return result if dtype is None else result.astype(dtype)
+
+    @property
+    def dtype(self):
+        return np.dtype([(x, self[x].dtype) for x in self._names])
+
+    @property
+    def shape(self):
+        return (self._size, )
+
+
+class StoreWriter():
+    """
+    Columnar Store Writer
+    ---------------------
+    Append groups of record arrays chunk by chunk to a columnar store. Every
+    column is written to its npy file directly, the array headers and the
+    metadata are completed when the writer is closed.
+
+    Parameters
+    ----------
+    path : str
+        Directory of the store, created if it does not exist.
+    """
+
+    def __init__(self, path):
+        makedirs(path, exist_ok=True)
+        # an incomplete store has no metadata
+        if exists(join(path, 'meta.json')):
+            remove(join(path, 'meta.json'))
+
+        self.attrs = {}
+        self.size = 0
+
+        self._path = path
+        self._groups = {}
+        self._files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *_):
+        if exc_type is None:
+            self.close()
+        else:
+            self._close_files()
+
+    def append(self, groups):
+        """
+        Append one chunk.
+
+        Parameters
+        ----------
+        groups : dict
+            Record arrays (or `Columns`) of equal length keyed by group name.
+        """
+
+        for group, array in groups.items():
+            names = array.dtype.names
+            if group not in self._groups:
+                self._groups[group] = {'names': list(names), 'size': 0}
+            elif list(names) != self._groups[group]['names']:
+                raise ValueError('bad columns for group {}'.format(group))
+
+            for name in names:
+                column = np.ascontiguousarray(array[name])
+                key = (group, name)
+                if key not in self._files:
+                    file_ = join(self._path, '{}.{}.npy'.format(group, name))
+                    self._files[key] = [open(file_, 'wb'), column.dtype]
+                    _write_header(self._files[key][0], column.dtype, 0)
+                elif column.dtype != self._files[key][1]:
+                    raise ValueError('bad dtype for column {}'.format(name))
+                column.tofile(self._files[key][0])
+
+            self._groups[group]['size'] += len(array)
+
+        self.size = max((x['size'] for x in self._groups.values()), default=0)
+
+    def close(self):
+        for (group, _), (f, dtype) in self._files.items():
+            f.seek(0)
+            _write_header(f, dtype, self._groups[group]['size'])
+        self._close_files()
+
+        meta = {
+            'version': _format_version,
+            'groups': self._groups,
+            'attrs': self.attrs,
+        }
+        with open(join(self._path, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+    def _close_files(self):
+        for f, _ in self._files.values():
+            f.close()
+        self._files = {}
+
+
+def save_store(path, groups, attrs=None):
+    """
+    Save groups of record arrays as a columnar store.
+
+    Parameters
+    ----------
+    path : str
+        Directory of the store, created if it does not exist.
+    groups : dict
+        Record arrays (or `Columns`) keyed by group name.
+    attrs : dict, optional
+        Extra scalar attributes saved with the store.
+    """
+
+    with StoreWriter(path) as writer:
+        writer.append(groups)
+        if attrs is not None:
+            writer.attrs.update(attrs)
+
+
+def load_store(path):
+    """
+    Open a columnar store.
+
+    Parameters
+    ----------
+    path : str
+        Directory of the store.
+
+    Returns
+    -------
+    groups : dict
+        `Columns` keyed by group name, nothing is read until a column is
+        accessed.
+    attrs : dict
+        Extra attributes saved with the store.
+    """
+
+    with open(join(path, 'meta.json'), 'r') as f:
+        meta = json.load(f)
+
+    if meta.get('version') != _format_version:
+        raise ValueError('unknown store version')
+
+    groups = {
+        x: Columns(path, x, y['names'], y['size'])
+        for x, y in meta['groups'].items()
+    }
+    return groups, meta['attrs']
+
+
+def _write_header(f, dtype, size):
+    # npy format 1.0 with a fixed header length, so that the header can be
+    # rewritten in place once the final size is known
+    header = "{{'descr': {!r}, 'fortran_order': False, 'shape': ({},), }}"
+    header = header.format(np.lib.format.dtype_to_descr(dtype), size)
+    header = header.ljust(_header_size - 11) + '\n'
+    if len(header) != _header_size - 10:
+        raise ValueError('unsupported dtype {}'.format(dtype))
+    f.write(b'\x93NUMPY\x01\x00')
+    f.write(struct.pack('<H', len(header)))
+    f.write(header.encode('latin1'))
@@ -0,0 +1,102 @@
+# Author: Chao Gu, 2018
+
+import json
+
+import numpy as np
+
+from ._run_db import RunDB
+from ._run_set import RunSet
+
+__all__ = ['Subtraction']
+
+
+class Subtraction():
+    """
+    Empty Target Subtraction
+    ------------------------
+    Charge-normalized yield of the production runs of a setting minus that of
+    its empty target runs. The runs of each target are histogrammed together
+    with the same binning, see `RunSet.get_yield`, and the statistical errors
+    of both yields are added in quadrature.
+
+    The empty target yield is cached for each variable, binning and cuts, so
+    scanning cuts or weights of the production runs does not histogram the
+    empty runs again.
+
+    Parameters
+    ----------
+    files : sequence of str
+        Files of the production runs, see `RunSet`.
+    empty_files : sequence of str
+        Files of the empty target runs.
+    refdb : RunDB, optional
+        Reference run for the efficiencies and the slow raster cut of the
+        empty runs, default is the first production run.
+
+    Examples
+    --------
+    >>> sub = Subtraction(['data/g2p_5654.cols'], ['data/g2p_5650.cols'])
+    >>> sub.cuts = cuts
+    >>> yield_, error = sub.get_yield('nu', bins=800, range=(-100, 1500))
+    """
+
+    def __init__(self, files, empty_files, *, refdb=None):
+        self.production = RunSet(files)
+        if refdb is None:
+            refdb = RunDB(int(self.production.runs[0]))
+        self.empty = RunSet(empty_files, refdb=refdb)
+        self._empty_cache = {}
+
+    @property
+    def cuts(self):
+        return self.production._cuts
+
+    @cuts.setter
+    def cuts(self, value):
+        self.production.cuts = value
+        self.empty.cuts = value
+
+    def get_yield(self, var, **kwargs):
+        """
+        Subtracted yield of a variable.
+
+        Parameters
+        ----------
+        var : str
+            Name of the histogrammed attribute, such as 'nu'.
+        bins : int
+            Number of uniform bins.
+        range : (float, float)
+            Lower and upper edges.
+        weights : rank-1 array of float, optional
+            Weight of each production event.
+        deadtime : {'deadtime', 'deadtime_plus', 'deadtime_minus'}
+            Deadtime used for the scale factors.
+        charge : {'charge', 'charge_plus', 'charge_minus'}
+            Charge used for the normalization.
+
+        Returns
+        -------
+        yield_, error : rank-1 array of float
+            Subtracted yield and its statistical error in each bin.
+        """
+
+        yield_p, error_p = self.production.get_yield(var, **kwargs)
+        yield_e, error_e = self.get_empty_yield(var, **kwargs)
+        return yield_p - yield_e, np.sqrt(error_p**2 + error_e**2)
+
+    def get_empty_yield(self, var, **kwargs):
+        """
+        Cached yield of the empty target runs, see `get_yield`. `weights` is
+        ignored since it belongs to the production events.
+        """
+
+        kwargs = {x: y for x, y in kwargs.items() if x != 'weights'}
+        key = json.dumps(
+            [var, kwargs, self.empty._cuts],
+            sort_keys=True,
+            default=list,
+        )
+        if key not in self._empty_cache:
+            self._empty_cache[key] = self.empty.get_yield(var, **kwargs)
+        return self._empty_cache[key]
@@ -0,0 +1,242 @@
+"""
+Acceptance Correction
+=====================
+
+Fit the acceptance correction as a polynomial of dp, from the overlap of the
+yields of neighbouring momentum settings. The yield of each setting at its
+central momentum is compared with the yield of the other settings at the
+same nu, the ratios of all settings are fitted together.
+
+    get_weight -- Acceptance correction of each event
+    window_average -- Average of the bins around given bins
+    fit_polynomial -- Least-squares polynomial fit, batched over weights
+    fit_correction -- Fit the correction to the yields of all settings
+    bootstrap -- Bootstrap samples of a polynomial fit
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.interpolate import CubicSpline
+
+__all__ = [
+    'bootstrap',
+    'fit_correction',
+    'fit_polynomial',
+    'get_weight',
+    'window_average',
+]
+
+
+def get_weight(x, corr):
+    """
+    Return the acceptance correction, a polynomial of x (such as rec.d) with
+    coefficients `corr` from the highest order, such as the values of
+    `configs.corrections`.
+    """
+
+    return np.polyval(corr, x)
+
+
+def window_average(hists, index, half_width=5):
+    """
+    Average each histogram over the bins within `half_width` of a given bin.
+
+    Parameters
+    ----------
+    hists : rank-2 array of float
+        One histogram per row.
+    index : rank-1 array of int
+        Central bin of each histogram, at least `half_width` bins away from
+        the edges.
+    half_width : int
+        Number of bins on each side of the central bin.
+
+    Returns
+    -------
+    rank-1 array of float
+        Average of each histogram.
+    """
+
+    hists = np.asarray(hists, dtype=np.float64)
+    index = np.asarray(index)
+    cumsum = np.zeros((hists.shape[0], hists.shape[1] + 1))
+    np.cumsum(hists, axis=1, out=cumsum[:, 1:])
+
+    rows = np.arange(hists.shape[0])
+    total = (cumsum[rows, index + half_width + 1] -
+             cumsum[rows, index - half_width])
+    return total / (2 * half_width + 1)
+
+
+def fit_polynomial(x, y, deg, weights=None):
+    """
+    Least-squares polynomial fit.
+
+    Parameters
+    ----------
+    x, y : rank-1 array of float
+        Points to fit.
+    deg : int
+        Degree of the polynomial.
+    weights : rank-1 or rank-2 array of float, optional
+        Weight of each point, or one set of weights per row. All rows are
+        solved at once.
+
+    Returns
+    -------
+    rank-1 or rank-2 array of float
+        Coefficients from the highest order, like `np.polyfit`, one row for
+        each row of `weights`.
+    """
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # scale x to [-1, 1] to keep the normal equations well conditioned
+    scale = np.max(np.abs(x)) if x.size > 0 else 0.0
+    if scale == 0:
+        scale = 1.0
+    v = np.vander(x / scale, deg + 1)
+
+    if weights is None:
+        pars = np.linalg.lstsq(v, y, rcond=None)[0]
+    else:
+        weights = np.asarray(weights, dtype=np.float64)
+        a = np.einsum('...n,ni,nj->...ij', weights, v, v)
+        b = np.einsum('...n,ni,n->...i', weights, v, y)
+        pars = np.linalg.solve(a, b[..., None])[..., 0]
+
+    return pars / scale**np.arange(deg, -1, -1)
+
+
+def fit_correction(nu, hists, e0, p0, *, deg=3, dp_range=(0.039, 0.039),
+                   limits=(0.7, 1.3), half_width=5, fit=None):
+    """
+    Fit the acceptance correction to the yields of all settings.
+
+    The yield at the central momentum of each setting is the average of the
+    bins within `half_width` of it, these yields are interpolated in nu with
+    a cubic spline. The correction of a bin is the interpolated yield divided
+    by the yield of the bin, and is fitted as a polynomial of dp.
+
+    Parameters
+    ----------
+    nu : rank-1 array of float
+        Centers of the uniform bins.
+    hists : rank-2 array of float
+        Yield of each setting, corrected by the acceptance.
+    e0 : float
+        Beam energy.
+    p0 : rank-1 array of float
+        Central momentum of each setting.
+    deg : int
+        Degree of the polynomial.
+    dp_range : (float, float)
+        Bins with dp in (-dp_range[0], dp_range[1]) are compared.
+    limits : (float, float)
+        Only corrections within limits are fitted.
+    half_width : int
+        Number of bins averaged on each side of the central bin.
+    fit : rank-1 array of bool, optional
+        Settings included in the fit, default is all.
+
+    Returns
+    -------
+    dict
+        'nu' and 'yield' at the central momentum of each setting, the
+        interpolation 'yield_func', 'dp' and 'corr' of each bin (rank-2,
+        NaN outside of `dp_range`), the fitted bins in 'select', and the
+        coefficients 'pars' from the highest order.
+    """
+
+    nu = np.asarray(nu, dtype=np.float64)
+    hists = np.asarray(hists, dtype=np.float64)
+    p0 = np.asarray(p0, dtype=np.float64)
+
+    width = nu[1] - nu[0]
+    low = nu[0] - width / 2
+
+    center = ((e0 - p0 - low) / width).astype(int)
+    yield_ = window_average(hists, center, half_width)
+    order = np.argsort(e0 - p0)
+    yield_func = CubicSpline((e0 - p0)[order], yield_[order])
+
+    min_ = ((e0 - p0 * (1 + dp_range[0]) - low) / width).astype(int)
+    max_ = ((e0 - p0 * (1 - dp_range[1]) - low) / width).astype(int)
+    index = np.arange(len(nu))
+    window = (index >= min_[:, None]) & (index < max_[:, None])
+
+    dp = (e0 - p0[:, None] - nu) / p0[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = yield_func(nu) / hists
+    dp = np.where(window, dp, np.nan)
+    corr = np.where(window, corr, np.nan)
+
+    if fit is None:
+        fit = np.ones(len(p0), dtype=bool)
+    with np.errstate(invalid='ignore'):
+        select = (window & np.asarray(fit)[:, None] & (corr > limits[0]) &
+                  (corr < limits[1]))
+
+    return {
+        'nu': e0 - p0,
+        'yield': yield_,
+        'yield_func': yield_func,
+        'dp': dp,
+        'corr': corr,
+        'select': select,
+        'pars': fit_polynomial(dp[select], corr[select], deg),
+    }
+
+
+def bootstrap(x, y, deg, n=1000, *, workers=None, seed=None, chunk_size=100):
+    """
+    Fit a polynomial to bootstrap resamples of the points, in parallel.
+
+    Each resample is drawn with replacement and fitted as weights of the
+    points, the resamples of a chunk are solved at once. The result does not
+    depend on the number of workers.
+
+    Parameters
+    ----------
+    x, y : rank-1 array of float
+        Points to fit.
+    deg : int
+        Degree of the polynomial.
+    n : int
+        Number of resamples.
+    workers : int, optional
+        Number of worker processes, default is the number of CPUs.
+    seed : int, optional
+        Seed of the random generator.
+    chunk_size : int
+        Number of resamples of each task.
+
+    Returns
+    -------
+    rank-2 array of float
+        Coefficients of each resample, use `np.std(..., axis=0)` or
+        `np.cov(..., rowvar=False)` for their uncertainties.
+    """
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    sizes = [chunk_size] * (n // chunk_size)
+    if n % chunk_size:
+        sizes.append(n % chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_bootstrap, x, y, deg, size, seed_)
+            for size, seed_ in zip(sizes, seeds)
+        ]
+        return np.concatenate([f.result() for f in futures])
+
+
+def _bootstrap(x, y, deg, size, seed):
+    rng = np.random.default_rng(seed)
+    counts = rng.multinomial(len(x), np.full(len(x), 1 / len(x)), size=size)
+    return fit_polynomial(x, y, deg, weights=counts)
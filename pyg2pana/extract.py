@@ -0,0 +1,204 @@
+"""
+Run Extraction
+==============
+
+Convert the rootfiles of many runs to columnar stores with a pool of worker
+processes. A manifest records the size and modification time of the inputs
+and of the output files, the status and the wall time of each run, so that an
+interrupted campaign resumes where it stopped, and runs with changed inputs or
+a truncated or modified output are extracted again.
+
+    get_jobs -- Extraction jobs for a run list in `configs`
+    extract_runs -- Extract the runs in parallel
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from os.path import exists, join
+
+from ._data import Data
+from ._sim_file import SimFile
+
+__all__ = ['extract_runs', 'get_jobs']
+
+_readers = {'data': Data, 'sim': SimFile}
+
+
+def get_jobs(run_list, *, data_dir='data', sim_dir='sim'):
+    """
+    Return extraction jobs for the production and empty runs of a run list.
+
+    Parameters
+    ----------
+    run_list : dict
+        Run list keyed by momentum setting, such as `configs.l_22545000`.
+    data_dir : str
+        Directory of the data rootfiles and stores.
+    sim_dir : str
+        Directory of the simulation rootfiles and stores.
+
+    Returns
+    -------
+    list of dict
+        Each job has the keys 'kind' ('data' or 'sim'), 'run', 'files' and
+        'output'.
+    """
+
+    jobs = []
+    for value in run_list.values():
+        p_runs = value['production']
+        e_runs = value['empty']
+
+        for run in p_runs + e_runs:
+            files = [join(data_dir, 'g2p_{}.root'.format(run))]
+            files += [
+                join(data_dir, 'g2p_{}_{}.root'.format(run, x))
+                for x in range(1, 3)
+            ]
+            output = join(data_dir, 'g2p_{}.cols'.format(run))
+            jobs.append({
+                'kind': 'data',
+                'run': run,
+                'files': files,
+                'output': output,
+            })
+
+        for run in p_runs:
+            files = [
+                join(sim_dir, 'sim_{}_{}.root'.format(run, x))
+                for x in range(1, 11)
+            ]
+            output = join(sim_dir, 'sim_{}.cols'.format(run))
+            jobs.append({
+                'kind': 'sim',
+                'run': run,
+                'files': files,
+                'output': output,
+            })
+
+    return jobs
+
+
+def extract_runs(jobs, *, workers=None, manifest='manifest.json',
+                 chunk_size=1000000, backend=None, force=False):
+    """
+    Extract runs in parallel.
+
+    Parameters
+    ----------
+    jobs : sequence of dict
+        Extraction jobs, see `get_jobs`.
+    workers : int, optional
+        Number of worker processes, default is the number of CPUs.
+    manifest : str
+        Manifest file, read to skip finished runs and updated after each run.
+    chunk_size : int
+        Number of entries read at a time, see `Data.iter_chunks`.
+    backend : {None, 'uproot', 'root_numpy'}
+        Rootfile reader.
+    force : bool
+        Extract all runs even if the manifest says they are up to date.
+
+    Returns
+    -------
+    dict
+        Number of 'done', 'skipped', 'missing' and 'failed' runs, the total
+        'events' and 'wall_time', and the throughput of each worker in
+        'workers'.
+    """
+
+    records = {}
+    if exists(manifest):
+        with open(manifest, 'r') as f:
+            records = json.load(f)
+
+    summary = {'done': 0, 'skipped': 0, 'missing': 0, 'failed': 0}
+    pending = []
+    for job in jobs:
+        inputs = _get_inputs(job['files'])
+        record = records.get(job['output'])
+        if not inputs:
+            summary['missing'] += 1
+            continue
+        if (not force and record is not None and record['status'] == 'done'
+                and record['inputs'] == inputs
+                and exists(join(job['output'], 'meta.json'))
+                and record.get('outputs') == _get_outputs(job['output'])):
+            summary['skipped'] += 1
+            continue
+        pending.append((job, inputs))
+
+    start = time.time()
+    worker_stats = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_extract, job, chunk_size, backend): (job, inputs)
+            for job, inputs in pending
+        }
+        for future in as_completed(futures):
+            job, inputs = futures[future]
+            record = future.result()
+            record.update(kind=job['kind'], run=job['run'], inputs=inputs)
+            records[job['output']] = record
+            _save_manifest(manifest, records)
+
+            summary[record['status']] += 1
+            stats = worker_stats.setdefault(
+                str(record['worker']),
+                {'runs': 0, 'events': 0, 'wall_time': 0.0},
+            )
+            stats['runs'] += 1
+            stats['events'] += record['events']
+            stats['wall_time'] += record['wall_time']
+
+    for stats in worker_stats.values():
+        wall_time = stats['wall_time']
+        stats['rate'] = stats['events'] / wall_time if wall_time > 0 else 0.0
+
+    summary['events'] = sum(x['events'] for x in worker_stats.values())
+    summary['wall_time'] = time.time() - start
+    summary['workers'] = worker_stats
+    return summary
+
+
+def _extract(job, chunk_size, backend):
+    start = time.time()
+    record = {'worker': os.getpid(), 'events': 0, 'outputs': None}
+    try:
+        record['events'] = _readers[job['kind']].convert(
+            job['files'],
+            job['output'],
+            chunk_size,
+            backend=backend,
+        )
+        record['outputs'] = _get_outputs(job['output'])
+        record['status'] = 'done'
+    except Exception as e:
+        record['status'] = 'failed'
+        record['error'] = '{}: {}'.format(type(e).__name__, e)
+    record['wall_time'] = time.time() - start
+    return record
+
+
+def _get_inputs(files):
+    result = {}
+    for file_ in files:
+        if exists(file_):
+            stat = os.stat(file_)
+            result[file_] = [stat.st_size, stat.st_mtime]
+    return result
+
+
+def _get_outputs(path):
+    # the size and mtime of the store files, a truncated or rewritten store
+    # does not match its record
+    return _get_inputs([join(path, x) for x in sorted(os.listdir(path))])
+
+
+def _save_manifest(manifest, records):
+    temp = manifest + '.tmp'
+    with open(temp, 'w') as f:
+        json.dump(records, f, indent=2, sort_keys=True)
+    os.replace(temp, manifest)
@@ -5,12 +5,16 @@ Cross Section Models
 Provide a few elastic and inelastic electron scattering cross section models.
 
     Elastic -- Elastic cross section model
+    ModelCache -- Persistent cache of model results
     PBosted -- Peter Bosted's model
+    RadiatedTable -- Interpolated table of radiated cross sections
     radiate -- Functions to calculate radiative effect
 """
 
+from .cache import ModelCache
 from .elastic import Elastic
 from .pbosted import PBosted
+from .table import RadiatedTable
 from . import radiate, tools
 
 __all__ = [s for s in dir() if not s.startswith('_')]
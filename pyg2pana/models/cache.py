@@ -0,0 +1,227 @@
+# Author: Chao Gu, 2018
+
+import hashlib
+import inspect
+import json
+import numbers
+import os
+
+import numpy as np
+
+from .tools import cache_dir
+
+__all__ = ['ModelCache']
+
+# arguments which do not change the result
+_ignored = ('workers', 'executor')
+
+
+class ModelCache():
+    """
+    Model Evaluation Cache
+    ----------------------
+    Persistent cache of model results, shared by all scripts using the same
+    directory. A result is keyed by the model class and its scalar attributes
+    (such as z, a and radiate), the evaluated method, the scalar arguments
+    (such as tb and ta) and the content of the array arguments.
+
+    Every result is written to a temporary file first and renamed, so that
+    concurrent processes never read a partial file. When the total size
+    exceeds `max_size`, the least recently used results are removed. The size
+    is scanned once and then kept up to date by each write, results written
+    by other processes are counted at the next scan.
+
+    Parameters
+    ----------
+    path : str, optional
+        Cache directory, default is 'models' in `tools.cache_dir()`.
+    max_size : int
+        Maximum total size in bytes.
+
+    Examples
+    --------
+    >>> cache = ModelCache()
+    >>> model = PBosted(7, 14, radiate=True)
+    >>> xs = cache(model, e, ep, theta, tb, ta)
+    >>> components = cache(model.get_components, e, ep, theta)
+    """
+
+    def __init__(self, path=None, max_size=1 << 30):
+        if path is None:
+            path = os.path.join(cache_dir(), 'models')
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.max_size = max_size
+        self._size = None
+
+    def __call__(self, func, *args, **kwargs):
+        """
+        Return the cached result of func(*args, **kwargs), evaluate and save
+        it if it is not cached.
+
+        Parameters
+        ----------
+        func : model or bound method of a model
+            Model to evaluate, such as `PBosted(7, 14)` or its
+            `get_components` method.
+        """
+
+        file_ = self._get_file(self.get_key(func, args, kwargs))
+
+        try:
+            result = np.load(file_, allow_pickle=False)
+        except (FileNotFoundError, ValueError, EOFError):
+            pass
+        else:
+            try:
+                os.utime(file_)
+            except FileNotFoundError:
+                pass
+            if result.dtype.names is not None:
+                result = result.view(np.recarray)
+            return result[()] if result.ndim == 0 else result
+
+        result = func(*args, **kwargs)
+        self._save(file_, result)
+        return result
+
+    def get_key(self, func, args, kwargs):
+        """
+        Return the key of an evaluation.
+
+        The arguments are bound to the signature of `func` with the defaults
+        applied, so that positional and keyword forms of the same call share
+        a key. Numbers are compared as Python floats.
+        """
+
+        model = getattr(func, '__self__', func)
+        method = getattr(func, '__name__', '__call__')
+
+        sha = hashlib.sha256()
+        setting = {
+            'model': '{}.{}'.format(
+                type(model).__module__,
+                type(model).__qualname__,
+            ),
+            'method': method,
+            'attrs': {
+                x: _scalar(y)
+                for x, y in vars(model).items() if np.isscalar(y)
+            },
+        }
+        sha.update(json.dumps(setting, sort_keys=True, default=str).encode())
+
+        for name, value in _bind(func, args, kwargs):
+            sha.update(name.encode())
+            if np.isscalar(value) or value is None:
+                sha.update(repr(_scalar(value)).encode())
+            else:
+                value = np.ascontiguousarray(value)
+                sha.update('{}{}'.format(value.dtype.str,
+                                         value.shape).encode())
+                sha.update(value.tobytes())
+
+        return sha.hexdigest()
+
+    def clear(self):
+        """
+        Remove all cached results.
+        """
+
+        for file_, _, _ in self._list():
+            _remove(file_)
+        self._size = 0
+
+    @property
+    def size(self):
+        """
+        Total size of the cached results in bytes.
+        """
+
+        return sum(x[2] for x in self._list())
+
+    def _get_file(self, key):
+        return os.path.join(self.path, key[:2], key + '.npy')
+
+    def _save(self, file_, result):
+        os.makedirs(os.path.dirname(file_), exist_ok=True)
+        temp = '{}.{}.tmp'.format(file_, os.getpid())
+        with open(temp, 'wb') as f:
+            np.save(f, np.asarray(result), allow_pickle=False)
+        file_size = os.path.getsize(temp)
+        os.replace(temp, file_)
+
+        if self._size is None:
+            self._evict()
+        else:
+            self._size += file_size
+            if self._size > self.max_size:
+                self._evict()
+
+    def _list(self):
+        result = []
+        for directory, _, files in os.walk(self.path):
+            for name in files:
+                if not name.endswith('.npy'):
+                    continue
+                file_ = os.path.join(directory, name)
+                try:
+                    stat = os.stat(file_)
+                except FileNotFoundError:
+                    continue
+                result.append((file_, stat.st_mtime, stat.st_size))
+        return result
+
+    def _evict(self):
+        files = self._list()
+        size = sum(x[2] for x in files)
+        self._size = size
+        if size <= self.max_size:
+            return
+
+        # least recently used first, hits touch the file
+        files.sort(key=lambda x: x[1])
+        for file_, _, file_size in files:
+            if size <= self.max_size:
+                break
+            _remove(file_)
+            size -= file_size
+        self._size = size
+
+
+def _remove(file_):
+    try:
+        os.remove(file_)
+    except FileNotFoundError:
+        pass
+
+
+def _bind(func, args, kwargs):
+    # (name, value) of all arguments which change the result
+    try:
+        bound = inspect.signature(func).bind(*args, **kwargs)
+    except (TypeError, ValueError):
+        items = [(str(i), x) for i, x in enumerate(args)]
+        items += sorted(kwargs.items())
+    else:
+        bound.apply_defaults()
+        items = []
+        for name, value in bound.arguments.items():
+            kind = bound.signature.parameters[name].kind
+            if kind == inspect.Parameter.VAR_POSITIONAL:
+                items += [('{}{}'.format(name, i), x)
+                          for i, x in enumerate(value)]
+            elif kind == inspect.Parameter.VAR_KEYWORD:
+                items += sorted(value.items())
+            else:
+                items.append((name, value))
+    return [(x, y) for x, y in items if x not in _ignored]
+
+
+def _scalar(value):
+    # np.float64(2.2535), 2.2535 and np.int64(2), 2 hash the same
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, numbers.Real) and not isinstance(value, bool):
+        value = float(value)
+    return value
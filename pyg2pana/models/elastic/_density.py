@@ -2,8 +2,16 @@
 
 # C. W. De Jager et al., At. Data Nucl. Data Tables, 14(1974)479
 
+import hashlib
+import json
+import os
 from functools import partial
+
 import numpy as np
+from scipy import integrate
+from scipy.interpolate import CubicSpline
+
+from ..tools import cache_dir
 
 _pars_charge = {
     (2, 4): (
@@ -54,3 +62,81 @@ def get_density_func(par_set, z, a, par_id=0):
 
     if pars[0] in ('HO', 'MHO'):
         return partial(_ho, c=pars[1][0], z=pars[1][1])
+
+
+# fixed grids of the radius and the momentum transfer, in fm and fm^{-1}
+_r = np.linspace(0, 20, 4001)
+_q = np.linspace(0, 20, 2001)
+_chunk_size = 100
+
+
+def _fourier(density, q):
+    # \int rho(r) r sin(qr) / q dr, the q = 0 limit is \int rho(r) r^2 dr
+    rho_r = density(_r) * _r
+    result = np.empty(len(q))
+    for start in range(0, len(q), _chunk_size):
+        q_chunk = q[start:start + _chunk_size, None]
+        kernel = _r * np.sinc(q_chunk * _r / np.pi)
+        result[start:start + _chunk_size] = integrate.simpson(
+            rho_r * kernel,
+            x=_r,
+        )
+    return result
+
+
+def _form_factor(q, table, density, norm):
+    q = np.asarray(q, dtype=float)
+    result = table(np.minimum(q, _q[-1]))
+    outside = q > _q[-1]
+    if np.any(outside):
+        result = np.array(result)
+        result[outside] = _fourier(density, q[outside]) / norm
+    return result[()]
+
+
+def get_form_factor_func(par_set, z, a, par_id=0):
+    """
+    Return the form factor of a density as a function of q in fm^{-1}.
+
+    The Fourier transform of the density is tabulated on a fixed q grid by
+    Simpson's rule over r, saved in the cache directory and interpolated with
+    a cubic spline. None is returned if there is no density.
+    """
+
+    density = get_density_func(par_set, z, a, par_id)
+    if density is None:
+        return None
+
+    setting = json.dumps({
+        'density': density.func.__name__,
+        'pars': density.keywords,
+        'r': [_r[0], _r[-1], len(_r)],
+        'q': [_q[0], _q[-1], len(_q)],
+    }, sort_keys=True)
+    file_ = os.path.join(
+        cache_dir(),
+        'ff_{}_{}_{}_{}_{}.npy'.format(
+            par_set,
+            z,
+            a,
+            par_id,
+            hashlib.sha1(setting.encode()).hexdigest()[:8],
+        ),
+    )
+
+    if os.path.exists(file_):
+        values = np.load(file_)
+    else:
+        values = _fourier(density, _q)
+        values /= values[0]
+        temp = file_ + '.{}.tmp.npy'.format(os.getpid())
+        np.save(temp, values)
+        os.replace(temp, file_)
+
+    norm = _fourier(density, _q[:1])[0]
+    return partial(
+        _form_factor,
+        table=CubicSpline(_q, values),
+        density=density,
+        norm=norm,
+    )
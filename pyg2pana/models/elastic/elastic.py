@@ -3,9 +3,9 @@
 from functools import partial
 
 import numpy as np
-from scipy import constants, integrate
+from scipy import constants
 
-from ..tools import mass
+from ..tools import map_chunks, mass
 
 __all__ = ['Elastic']
 
@@ -18,8 +18,6 @@ _inv_gev_to_mkb = _inv_gev_to_fm**2 * 1e4  # GeV^{-2} to microbarn
 _res = 1e-3 / 3
 _sqrt_2pi = np.sqrt(2 * np.pi)
 
-_rho_limit = 20
-
 
 class Elastic():
     """
@@ -31,11 +29,15 @@ class Elastic():
         Atomic number.
     a : int
         Mass number.
+    par_id : int
+        Index of the charge density parameter set of He-4, C-12 and N-14,
+        their form factors are tabulated and cached on disk.
     """
 
-    def __init__(self, z, a):
+    def __init__(self, z, a, *, par_id=0):
         self.z = z
         self.a = a
+        self.par_id = par_id
         self.m = mass(z, a)
 
         if (z, a) == (1, 1):
@@ -47,27 +49,12 @@ class Elastic():
                 gm_func=gm_proton,
             )
         elif (z, a) in ((2, 4), (6, 12), (7, 14)):
-            from ._density import get_density_func
-
-            charge_density = get_density_func('charge', z, a)
-            magnet_density = get_density_func('magnetization', z, a)
-
-            # get the normalization factors
-            if charge_density is not None:
-                self.charge_density_0, _ = integrate.quad(
-                    lambda x: charge_density(x) * x**2,
-                    *(0, _rho_limit),
-                )
-            if magnet_density is not None:
-                self.magnet_density_0, _ = integrate.quad(
-                    lambda x: magnet_density(x) * x**2,
-                    *(0, _rho_limit),
-                )
+            from ._density import get_form_factor_func
 
             self.ff_func = partial(
                 self._ff_density,
-                charge_density_func=charge_density,
-                magnet_density_func=magnet_density,
+                ge_func=get_form_factor_func('charge', z, a, par_id),
+                gm_func=get_form_factor_func('magnetization', z, a),
             )
         else:
             self.ff_func = self._ff
@@ -91,6 +78,66 @@ class Elastic():
 
         return result
 
+    def tail(self, e, ep, theta, tb, ta, *, workers=None, executor=None):
+        """
+        Calculate elastic radiative tail, see `radiate.radiate_elastic_tail`.
+
+        Use `RadiatedTable` with `radiate=radiate.radiate_elastic_tail` to
+        tabulate it.
+
+        Parameters
+        ----------
+        e : float or rank-1 array of float
+            Energy of incident electron.
+        ep : float or rank-1 array of float
+            Energy of scattered electron.
+        theta : float or rank-1 array of float
+            Scattering angle.
+        tb : float
+            Radiation length before scattering.
+        ta : float
+            Radiation length after scattering.
+        workers : int, optional
+            Evaluate chunks of the points in this number of processes.
+        executor : concurrent.futures.Executor, optional
+            Evaluate chunks of the points with this executor.
+
+        Returns
+        -------
+        float or array of float
+            Tail in ub/(sr*GeV), a factor of 1000 larger than the
+            ub/(sr*MeV) of `PBosted`.
+        """
+
+        if any(not np.isscalar(x) for x in (e, ep, theta)):
+            e, ep, theta = np.broadcast_arrays(e, ep, theta)
+
+            if workers is not None or executor is not None:
+                return map_chunks(
+                    partial(self._tail, tb=tb, ta=ta),
+                    e,
+                    ep,
+                    theta,
+                    workers=workers,
+                    executor=executor,
+                )
+
+        return self._tail(e, ep, theta, tb=tb, ta=ta)
+
+    def _tail(self, e, ep, theta, *, tb, ta):
+        from ..radiate import radiate_elastic_tail
+
+        return radiate_elastic_tail(
+            self._xs,
+            self.z,
+            self.a,
+            e,
+            ep,
+            theta,
+            tb,
+            ta,
+        )
+
     def _xs(self, z, _, e, theta):
         sin2_theta_2 = np.sin(theta / 2)**2
         cos2_theta_2 = 1 - sin2_theta_2
@@ -109,22 +156,15 @@ class Elastic():
         q2_fm = q2 * _gev_to_inv_fm * _gev_to_inv_fm
 
         if self.z == 6:
-            if q2_fm < 3.2:
-                xa = 1.64
-            elif q2_fm > 3.5:  # second diffraction minimum
-                xa = 1.68
-            else:
-                xa = 0
+            # no correction around the second diffraction minimum
+            xa = np.where(q2_fm < 3.2, 1.64, np.where(q2_fm > 3.5, 1.68, 0))
         else:
             xa = 1.64
 
         result = 1 - x_alpha / (2 * (2 + 3 * x_alpha)) * q2_fm * xa**2
         result *= np.exp(-(q2_fm * xa**2) / 4)
 
-        if result < 1.0e-6:
-            return 1.0e-6
-
-        return result
+        return np.maximum(result, 1.0e-6)
 
     def _tau_epsilon(self, e, q2):
         el = e - q2 / (2 * self.m)
@@ -141,59 +181,11 @@ class Elastic():
         gm = gm_func(q2)
         return (epsilon * ge**2 + tau * gm**2) / (epsilon * (1 + tau))
 
-    def _ge_integrand(self, r, q, charge_density_func):
-        result = charge_density_func(r)
-        result *= r * np.sin(r * q) / (self.charge_density_0 * q)
-        return result
-
-    def _gm_integrand(self, r, q, magnet_density_func):
-        result = magnet_density_func(r)
-        result *= r * np.sin(r * q) / (self.magnet_density_0 * q)
-        return result
-
-    def _ff_density(self, e, q2, charge_density_func, magnet_density_func):
+    def _ff_density(self, e, q2, ge_func, gm_func):
         tau, epsilon = self._tau_epsilon(e, q2)
 
-        q = np.sqrt(q2)
-        q_fm = q * _gev_to_inv_fm
-        if np.isscalar(q_fm):
-            ge, gm = 0, 0
-            if charge_density_func is not None:
-                ge, _ = integrate.quad(
-                    self._ge_integrand,
-                    *(0, _rho_limit),
-                    args=(q_fm, charge_density_func),
-                )
-            if magnet_density_func is not None:
-                gm, _ = integrate.quad(
-                    self._gm_integrand,
-                    *(0, _rho_limit),
-                    args=(q_fm, magnet_density_func),
-                )
-        else:
-            ge = np.zeros_like(q_fm)
-            gm = np.zeros_like(q_fm)
-            if charge_density_func is not None:
-                it = np.nditer(
-                    [q_fm, ge],
-                    op_flags=[['readonly'], ['writeonly']],
-                )
-                for iq_fm, ige in it:
-                    ige[...], _ = integrate.quad(
-                        self._ge_integrand,
-                        *(0, _rho_limit),
-                        args=(iq_fm, charge_density_func),
-                    )
-            if magnet_density_func is not None:
-                it = np.nditer(
-                    [q_fm, gm],
-                    op_flags=[['readonly'], ['writeonly']],
-                )
-                for iq_fm, igm in it:
-                    igm[...], _ = integrate.quad(
-                        self._gm_integrand,
-                        *(0, _rho_limit),
-                        args=(iq_fm, magnet_density_func),
-                    )
+        q_fm = np.sqrt(q2) * _gev_to_inv_fm
+        ge = 0 if ge_func is None else ge_func(q_fm)
+        gm = 0 if gm_func is None else gm_func(q_fm)
 
         return (epsilon * ge**2 + tau * gm**2) / (epsilon * (1 + tau))
@@ -918,10 +918,14 @@ c new 5/07 values. Values 1 and 7 will be overridden below.
      & 0.14333E+01,0.13573E+00,0.22000E+00,0.82956E-01,0.95782E-01,
      & 0.10936E+00,0.37944E+00/
       real*8 xvalold(50),w2sv,q2sv,sigrsv(7),md,w2p,wp,wdifp,xprp,nu
-      logical first/.true./
+      logical first
       common/tst2/sigrsv,sig_nr,sig_mec
+!$omp threadprivate(/tst2/)
       real br2(7),br3(7)
-      save
+c keep only the constants and the tables of the first call, so that the
+c routine can be called from parallel threads
+      save mp,mp2,mpi,mpi2,meta,pi,alpha,br,ang,x0,mass,intwidth,sigr
+      save xvalold
 
       sig = 0.
       if(w2.lt.1.07327**2 .or. w2.gt.25 .or. 
@@ -931,11 +935,11 @@ c new 5/07 values. Values 1 and 7 will be overridden below.
       endif
 
 c do this if fitting masses or widths, else set first true in above
-      first=.false.
-      if(xvalold(1).ne.xval(1) .or.
-     >   xvalold(7).ne.xval(7)) first=.true.
-      xvalold(1)=xval(1)
-      xvalold(7)=xval(7)
+c the tables are filled by one thread, xvalold is updated when done.
+c the check is made inside the critical section, so that no thread reads
+c xvalold or the tables while another one writes them
+!$omp critical (resmodd_first)
+      first = xvalold(1).ne.xval(1) .or. xvalold(7).ne.xval(7)
 
       if(first) then
        mp = 0.9382727
@@ -1097,6 +1101,7 @@ c       enddo
 c       write(9,'(''xval50='',f10.4)') xval(50)
 c       close(unit=9)
       endif ! if first
+!$omp end critical (resmodd_first)
       
 ! get parameters into local variables
       num = 12
@@ -1275,6 +1280,7 @@ c    (arXiv:0712.3731). To be submitted to Phys. Rev. C.
       real*8 sig_mec
       logical first/.true./
       common/tst2/sigrsv,sig_nrsv,sig_mec
+!$omp threadprivate(/tst2/)
 
 
       mp = 0.9382727
@@ -1,8 +1,11 @@
 # Author: Chao Gu, 2018
 
+from functools import partial
+
 import numpy as np
 
 from . import _pbosted
+from ..tools import map_chunks
 
 __all__ = ['PBosted']
 
@@ -28,7 +31,8 @@ class PBosted():
         self.a = a
         self.radiate = radiate
 
-    def __call__(self, e, ep, theta, tb=0, ta=0):
+    def __call__(self, e, ep, theta, tb=0, ta=0, *, method='quad',
+                 workers=None, executor=None):
         """
         Calculate inelastic cross section for a particular nucleus.
 
@@ -44,20 +48,99 @@ class PBosted():
             Radiation length before scattering.
         ta : float
             Radiation length after scattering.
+        method : {'quad', 'gauss'}
+            Integration method of the radiative correction, see
+            `radiate.radiate_inelastic_xs`. 'gauss' integrates all points at
+            once and is much faster for arrays.
+        workers : int, optional
+            Evaluate chunks of the points in this number of processes.
+        executor : concurrent.futures.Executor, optional
+            Evaluate chunks of the points with this executor.
         """
 
         if any(not np.isscalar(x) for x in (e, ep, theta)):
             e, ep, theta = np.broadcast_arrays(e, ep, theta)
 
+            if workers is not None or executor is not None:
+                return map_chunks(
+                    partial(self._evaluate, tb=tb, ta=ta, method=method),
+                    e,
+                    ep,
+                    theta,
+                    workers=workers,
+                    executor=executor,
+                )
+
+        return self._evaluate(e, ep, theta, tb=tb, ta=ta, method=method)
+
+    def _evaluate(self, e, ep, theta, *, tb, ta, method):
         if self.radiate:
             from ..radiate import radiate_inelastic_xs as rad
-            result = rad(self._xs, self.z, self.a, e, ep, theta, tb, ta)
+            result = rad(
+                self._xs,
+                self.z,
+                self.a,
+                e,
+                ep,
+                theta,
+                tb,
+                ta,
+                method=method,
+            )
         else:
             result = self._xs(self.z, self.a, e, ep, theta)
 
         return result
 
+    def get_components(self, e, ep, theta):
+        """
+        Calculate the components of the non-radiated cross section.
+
+        Parameters
+        ----------
+        e : float or array of float
+            Energy of incident electron.
+        ep : float or array of float
+            Energy of scattered electron.
+        theta : float or array of float
+            Scattering angle.
+
+        Returns
+        -------
+        recarray
+            Fields 'xs_inelastic' and 'xs_qe' are the inelastic and the
+            quasi-elastic cross sections, 'F1' and 'F2' the sums of the
+            inelastic and quasi-elastic structure functions, and 'R' the
+            inelastic R, in the broadcast shape of the inputs.
+        """
+
+        shape = np.broadcast(e, ep, theta).shape
+        result = _pbosted.cal_sf_batch(
+            self.z,
+            self.a,
+            *(_compact(x) for x in (e, ep, theta)),
+        )
+        return np.rec.fromarrays(
+            [x.reshape(shape) for x in result],
+            names=['xs_inelastic', 'xs_qe', 'F1', 'F2', 'R'],
+        )
+
     def _xs(self, z, a, e, ep, theta):
         if any(not np.isscalar(x) for x in (e, ep, theta)):
-            return _pbosted.cal_xs_array(z, a, e, ep, theta)
+            # the batched kernel runs without the GIL, in OpenMP threads
+            shape = np.broadcast(e, ep, theta).shape
+            result = _pbosted.cal_xs_batch(
+                z,
+                a,
+                *(_compact(x) for x in (e, ep, theta)),
+            )
+            return result.reshape(shape)
         return _pbosted.cal_xs_scalar(z, a, e, ep, theta)
+
+
+def _compact(x):
+    # pass a broadcast array as its single value instead of a full copy
+    x = np.asarray(x, dtype=np.float64)
+    if not any(x.strides):
+        return np.full(1, x.flat[0])
+    return x.ravel()
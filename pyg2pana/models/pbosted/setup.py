@@ -8,6 +8,9 @@ def configuration(parent_package='', top_path=None):
     config.add_extension(
         '_pbosted',
         sources=['pbosted.pyf', 'pbosted.f95', 'F1F209.f'],
+        extra_f77_compile_args=['-fopenmp'],
+        extra_f90_compile_args=['-fopenmp'],
+        extra_link_args=['-fopenmp'],
     )
     return config
 
@@ -1,18 +1,25 @@
 # Author: Chao Gu, 2018
 
+import warnings
+
 import numpy as np
 from scipy import constants, integrate, special
 
 from .tools import mass
 
-__all__ = ['radiate_inelastic_xs']
+__all__ = ['radiate_elastic_tail', 'radiate_inelastic_xs']
 
 _alpha = constants.alpha
 _alpha_pi = constants.alpha / np.pi
 _m_e = constants.value('electron mass energy equivalent in MeV') / 1000
+_m_p = constants.value('proton mass energy equivalent in MeV') / 1000
+
+# W of the quasi-elastic peak, the pion threshold and the first resonances
+_w_peaks = np.array([_m_p, 1.073, 1.232, 1.52, 1.68])
 
 
-def radiate_inelastic_xs(func, z, a, e, ep, theta, tb, ta, *, args=()):
+def radiate_inelastic_xs(func, z, a, e, ep, theta, tb, ta, *, args=(),
+                         method='quad', epsrel=1e-3):
     """
     Return radiated inelastic cross section.
 
@@ -36,6 +43,13 @@ def radiate_inelastic_xs(func, z, a, e, ep, theta, tb, ta, *, args=()):
         Radiation length after scattering.
     args : tuple, optional
         Extra arguments to pass to function, if any.
+    method : {'quad', 'gauss'}
+        Integrate each point with `scipy.integrate.quad` (default), or all
+        points at once with adaptive Gauss-Kronrod quadrature in the
+        logarithm of the radiated energy. With 'gauss', `func` must accept
+        rank-1 arrays and is called once for each refinement step.
+    epsrel : float
+        Relative accuracy of the integrals.
 
     References
     ----------
@@ -47,31 +61,18 @@ def radiate_inelastic_xs(func, z, a, e, ep, theta, tb, ta, *, args=()):
 
     # scalars
     de = 0.005  # (A83)
-    logz13 = np.log(183 * np.power(z, -1 / 3))
-    eta = np.log(1440 * np.power(z, -2 / 3)) / logz13  # (A46)
-    b = 4 / 3 * (1 + 1 / 9 * ((z + 1) / (z + eta)) / logz13)  # (A45)
+    b, xi = _get_b_xi(z, tb, ta)
     t = tb + ta  # (A47)
-    xi = _m_e / (2 * _alpha_pi) * t / ((z + eta) * logz13)  # (A52)
 
     # vectors
     sin2_theta_2 = np.sin(theta / 2)**2
     q2 = 4 * es * ep * sin2_theta_2
     r = (m_t + 2 * es * sin2_theta_2) / (m_t - 2 * ep * sin2_theta_2)
     tr = _alpha_pi * (np.log(q2 / _m_e**2) - 1) / b  # (A57)
+    spence = _spence(sin2_theta_2)
 
-    # in scipy, spence is defined as \int_0^z log(t)/(1-t) dt
-    # spence in the reference is spence(1 - z) here
-    # so use 1 - cos2_theta_2 = sin2_theta_2
-    spence = special.spence(sin2_theta_2)  # (A48)
-
-    # (A44)
     def _f(es, ep, q2, spence):
-        logq2me = np.log(q2 / _m_e**2)
-        ff = 1 + 0.5772 * b * t
-        ff += 2 * _alpha_pi * (-14 / 9 + 13 / 12 * logq2me)
-        ff -= _alpha_pi / 2 * (np.log(es / ep))**2
-        ff += _alpha_pi * (np.pi**2 / 6 - spence)
-        return ff
+        return _get_f(es, ep, q2, spence, b, t)
 
     # (A82), 1st term
     term1_1 = np.power(r * de / es, b * (tb + tr))
@@ -80,10 +81,6 @@ def radiate_inelastic_xs(func, z, a, e, ep, theta, tb, ta, *, args=()):
     xs = func(z, a, es, ep, theta, *args)
     term1 = term1_1 * term1_2 * term1_3 * _f(es, ep, q2, spence) * xs
 
-    # (A54)
-    def _phi(v):
-        return 1 - v + 0.75 * v**2
-
     # (A82), 2nd term, integrand
     def term2_integrand(esp, es, ep, theta, q2, r, tr, spence):
         term2_1 = np.power((es - esp) / (ep * r), b * (ta + tr))
@@ -102,20 +99,66 @@ def radiate_inelastic_xs(func, z, a, e, ep, theta, tb, ta, *, args=()):
         xs = func(z, a, es, epp, theta, *args)
         return term3_1 * term3_2 * term3_3 * _f(es, ep, q2, spence) * xs
 
-    if np.isscalar(term1):
+    if method == 'gauss':
+        pars = np.broadcast_arrays(
+            *map(np.atleast_1d, (es, ep, theta, q2, r, tr, spence)))
+        shape = pars[0].shape
+        pars = [x.ravel() for x in pars]
+        es_a, ep_a, theta_a, q2_a, r_a = pars[:5]
+
+        def term2_w(w, index):
+            # w = es - esp
+            values = [x[index, None] for x in pars]
+            values = np.broadcast_arrays(values[0] - w, *values)
+            values = [x.ravel() for x in values]
+            return term2_integrand(*values).reshape(w.shape)
+
+        def term3_w(w, index):
+            # w = epp - ep
+            values = [x[index, None] for x in pars]
+            values = np.broadcast_arrays(values[1] + w, *values)
+            values = [x.ravel() for x in values]
+            return term3_integrand(*values).reshape(w.shape)
+
+        # quasi-elastic and resonance peaks as extra interval edges
+        w2_peaks = _w_peaks[:, None]**2 - _m_p**2
+        sin2_a = np.sin(theta_a / 2)**2
+        esp_peaks = (w2_peaks + 2 * _m_p * ep_a) / (2 * _m_p -
+                                                    4 * ep_a * sin2_a)
+        epp_peaks = (2 * _m_p * es_a - w2_peaks) / (2 * _m_p +
+                                                    4 * es_a * sin2_a)
+
+        term2 = _integrate_log(
+            term2_w,
+            r_a * de,
+            es_a - ep_a / (1 - q2_a / (2 * es_a * m_t)),  # (A50)
+            epsrel,
+            points=(es_a - esp_peaks).T,
+        ).reshape(shape)
+        term3 = _integrate_log(
+            term3_w,
+            de,
+            es_a / (1 + q2_a / (2 * ep_a * m_t)) - ep_a,  # (A51)
+            epsrel,
+            points=(epp_peaks - ep_a).T,
+        ).reshape(shape)
+
+        if np.isscalar(term1):
+            term2, term3 = term2.item(), term3.item()
+    elif np.isscalar(term1):
         term2, _ = integrate.quad(
             term2_integrand,
             ep / (1 - q2 / (2 * es * m_t)), # (A50)
             es - r * de,
             args=(es, ep, theta, q2, r, tr, spence),
-            epsrel=1e-3,
+            epsrel=epsrel,
         )
         term3, _ = integrate.quad(
             term3_integrand,
             ep + de,
             es / (1 + q2 / (2 * ep * m_t)), # (A51)
             args=(es, ep, theta, q2, r, tr, spence),
-            epsrel=1e-3,
+            epsrel=epsrel,
         )
     else:
         term2 = np.zeros_like(term1)
@@ -131,15 +174,254 @@ def radiate_inelastic_xs(func, z, a, e, ep, theta, tb, ta, *, args=()):
                 term2_integrand,
                 iep / (1 - iq2 / (2 * ies * m_t)), # (A50)
                 ies - ir * de,
-                args=(ies, iep, itheta, iq2, ir, itr, ispence),
-                epsrel=1e-3,
+                args=tuple(
+                    float(x)
+                    for x in (ies, iep, itheta, iq2, ir, itr, ispence)),
+                epsrel=epsrel,
             )
             iterm3[...], _ = integrate.quad(
                 term3_integrand,
                 iep + de,
                 ies / (1 + iq2 / (2 * iep * m_t)), # (A51)
-                args=(ies, iep, itheta, iq2, ir, itr, ispence),
-                epsrel=1e-3,
+                args=tuple(
+                    float(x)
+                    for x in (ies, iep, itheta, iq2, ir, itr, ispence)),
+                epsrel=epsrel,
             )
 
     return term1 + term2 + term3
+
+
+def radiate_elastic_tail(func, z, a, e, ep, theta, tb, ta, *, args=()):
+    """
+    Return elastic radiative tail.
+
+    The 2nd and 3rd terms of (A82) are evaluated with the elastic cross
+    section, whose delta function in the energy of the scattered electron
+    removes the integrals. Radiation before scattering contributes at the
+    incident energy esp whose elastic peak is at ep, radiation after
+    scattering at the elastic peak epp of the incident energy. The tail is 0
+    above the elastic peak.
+
+    Parameters
+    ----------
+    func : callable
+        Non-radiated elastic cross section function, called as
+        func(z, a, e, theta, *args).
+    z : int
+        Atomic number.
+    a : int
+        Mass number.
+    e : float or array of float
+        Energy of incident electron.
+    ep : float or array of float
+        Energy of scattered electron.
+    theta : float or array of float
+        Scattering angle.
+    tb : float
+        Radiation length before scattering.
+    ta : float
+        Radiation length after scattering.
+    args : tuple, optional
+        Extra arguments to pass to function, if any.
+
+    Returns
+    -------
+    float or array of float
+        Tail in the unit of `func` per GeV, ub/(sr*GeV) with `Elastic`.
+        `PBosted` returns ub/(sr*MeV), divide the tail by 1000 before
+        subtracting it from such a spectrum.
+
+    References
+    ----------
+    S. Stein et al., Phys. Rev. D 12(1975)1884
+    """
+
+    es = e
+    m_t = mass(z, a)
+
+    # scalars
+    b, xi = _get_b_xi(z, tb, ta)
+    t = tb + ta  # (A47)
+
+    # vectors
+    es, ep, theta = np.broadcast_arrays(es, ep, theta)
+    sin2_theta_2 = np.sin(theta / 2)**2
+    q2 = 4 * es * ep * sin2_theta_2
+    r = (m_t + 2 * es * sin2_theta_2) / (m_t - 2 * ep * sin2_theta_2)
+    tr = _alpha_pi * (np.log(q2 / _m_e**2) - 1) / b  # (A57)
+    f = _get_f(es, ep, q2, _spence(sin2_theta_2), b, t)
+
+    # (A82), 2nd term, at the incident energy of the elastic peak at ep
+    # the delta function gives the jacobian (esp / ep)**2
+    recoil = 1 - 2 * ep * sin2_theta_2 / m_t
+    valid2 = recoil > 0
+    esp = ep / np.where(valid2, recoil, 1)
+    ws = es - esp
+    valid2 &= ws > 0
+    ws = np.where(valid2, ws, 1)
+    esp = np.where(valid2, esp, es)
+    term2_1 = np.power(ws / (ep * r), b * (ta + tr))
+    term2_2 = np.power(ws / es, b * (tb + tr))
+    term2_3 = b * (tb + tr) / ws * _phi(ws / es)
+    term2_3 += xi / (2 * ws**2)
+    xs = func(z, a, esp, theta, *args)
+    term2 = term2_1 * term2_2 * term2_3 * f * xs * (esp / ep)**2
+    term2 = np.where(valid2, term2, 0)
+
+    # (A82), 3rd term, at the elastic peak of the incident energy
+    epp = es / (1 + 2 * es * sin2_theta_2 / m_t)
+    wp = epp - ep
+    valid3 = wp > 0
+    wp = np.where(valid3, wp, 1)
+    term3_1 = np.power(wp / epp, b * (ta + tr))
+    term3_2 = np.power(wp * r / es, b * (tb + tr))
+    term3_3 = b * (ta + tr) / wp * _phi(wp / epp)
+    term3_3 += xi / (2 * wp**2)
+    xs = func(z, a, es, theta, *args)
+    term3 = term3_1 * term3_2 * term3_3 * f * xs
+    term3 = np.where(valid3, term3, 0)
+
+    return (term2 + term3)[()]
+
+
+def _get_b_xi(z, tb, ta):
+    logz13 = np.log(183 * np.power(z, -1 / 3))
+    eta = np.log(1440 * np.power(z, -2 / 3)) / logz13  # (A46)
+    b = 4 / 3 * (1 + 1 / 9 * ((z + 1) / (z + eta)) / logz13)  # (A45)
+    xi = _m_e / (2 * _alpha_pi) * (tb + ta) / ((z + eta) * logz13)  # (A52)
+    return b, xi
+
+
+def _spence(sin2_theta_2):
+    # in scipy, spence is defined as \int_0^z log(t)/(1-t) dt
+    # spence in the reference is spence(1 - z) here
+    # so use 1 - cos2_theta_2 = sin2_theta_2
+    return special.spence(sin2_theta_2)  # (A48)
+
+
+# (A44)
+def _get_f(es, ep, q2, spence, b, t):
+    logq2me = np.log(q2 / _m_e**2)
+    ff = 1 + 0.5772 * b * t
+    ff += 2 * _alpha_pi * (-14 / 9 + 13 / 12 * logq2me)
+    ff -= _alpha_pi / 2 * (np.log(es / ep))**2
+    ff += _alpha_pi * (np.pi**2 / 6 - spence)
+    return ff
+
+
+# (A54)
+def _phi(v):
+    return 1 - v + 0.75 * v**2
+
+
+# 15-point Gauss-Kronrod rule, same as QUADPACK's qk15
+_xgk = np.array([
+    0.991455371120812639206854697526329, 0.949107912342758524526189684047851,
+    0.864864423359769072789712788640926, 0.741531185599394439863864773280788,
+    0.586087235467691130294144845693013, 0.405845151377397166906606412076961,
+    0.207784955007898467600689403773245, 0.000000000000000000000000000000000
+])
+_wgk = np.array([
+    0.022935322010529224963732008058970, 0.063092092629978553290700663189204,
+    0.104790010322250183839876322541518, 0.140653259715525918745189590510238,
+    0.169004726639267902826583426598550, 0.190350578064785409913256402421014,
+    0.204432940075298892414161999234649, 0.209482141084727828012999174891714
+])
+_wg = np.array([
+    0.129484966168869693270611432679082, 0.279705391489276667901467771423780,
+    0.381830050505118944950369775488975, 0.417959183673469387755102040816327
+])
+_gk_nodes = np.concatenate([-_xgk[:-1], _xgk[::-1]])
+_gk_weights = np.concatenate([_wgk[:-1], _wgk[::-1]])
+_g_weights = np.zeros(15)
+_g_weights[1:7:2] = _wg[:-1]
+_g_weights[7] = _wg[-1]
+_g_weights[9:15:2] = _wg[-2::-1]
+
+
+def _integrate_log(func, lo, hi, epsrel, points=None, panels=4,
+                   max_iter=30):
+    """
+    Integrate func(w) from lo to hi for many points at once.
+
+    The integration variable is log(w), which absorbs the 1/w behavior of
+    the bremsstrahlung spectrum. Each interval is split into `panels`
+    intervals first. In each step the intervals not evaluated yet are
+    integrated with the 15-point Gauss-Kronrod rule, in a single call of
+    func(w, index) with w of shape (n_intervals, 15) and the point of each
+    interval in `index`. Points whose total error estimate is below
+    `epsrel` are done, otherwise their intervals with large errors are
+    bisected, as in QUADPACK. An IntegrationWarning is issued for the points
+    not converged after `max_iter` steps. Narrow peaks are found reliably
+    only if their positions are given as extra interval edges in `points`,
+    an array of shape (len(lo), n_points).
+    """
+
+    lo, hi = np.broadcast_arrays(lo, hi)
+    result = np.zeros(hi.shape)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        todo = np.flatnonzero((lo > 0) & (hi > lo))
+        u_lo = np.log(lo[todo])
+        u_hi = np.log(hi[todo])
+
+    width = (u_hi - u_lo) / panels
+    edges = u_lo[:, None] + width[:, None] * np.arange(panels + 1)
+    if points is not None:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            u_points = np.log(np.asarray(points)[todo])
+        u_points = np.clip(
+            np.nan_to_num(u_points, nan=-np.inf),
+            u_lo[:, None],
+            u_hi[:, None],
+        )
+        edges = np.sort(np.concatenate([edges, u_points], axis=1), axis=1)
+    index = np.repeat(todo, edges.shape[1] - 1)
+    a = edges[:, :-1].ravel()
+    b = edges[:, 1:].ravel()
+    value = np.full(a.shape, np.nan)
+    error = np.full(a.shape, np.nan)
+
+    for i in range(max_iter + 1):
+        new = np.isnan(value)
+        if np.any(new):
+            center = (a[new] + b[new]) / 2
+            half = (b[new] - a[new]) / 2
+            w = np.exp(center[:, None] + half[:, None] * _gk_nodes)
+            f = func(w, index[new]) * w
+            value[new] = f @ _gk_weights * half
+            error[new] = np.abs(value[new] - f @ _g_weights * half)
+
+        points, inverse = np.unique(index, return_inverse=True)
+        total = np.bincount(inverse, weights=value)
+        total_error = np.bincount(inverse, weights=error)
+        done = total_error <= epsrel * np.abs(total)
+        if i == max_iter:
+            if not np.all(done):
+                warnings.warn(
+                    'the maximum number of subdivisions ({}) has been '
+                    'achieved for {} points'.format(max_iter,
+                                                    np.count_nonzero(~done)),
+                    integrate.IntegrationWarning,
+                )
+            done[:] = True
+        result[points[done]] = total[done]
+        if np.all(done):
+            break
+
+        keep = ~done[inverse]
+        n_intervals = np.bincount(inverse)
+        tolerance = (epsrel * np.abs(total) / n_intervals)[inverse]
+        split = keep & (error > tolerance)
+        stay = keep & ~split
+
+        middle = (a[split] + b[split]) / 2
+        index = np.concatenate([index[stay], index[split], index[split]])
+        a, b = (np.concatenate([a[stay], a[split], middle]),
+                np.concatenate([b[stay], middle, b[split]]))
+        value = np.concatenate([value[stay], np.full(2 * len(middle),
+                                                     np.nan)])
+        error = np.concatenate([error[stay], np.full(2 * len(middle),
+                                                     np.nan)])
+
+    return result
@@ -0,0 +1,176 @@
+# Author: Chao Gu, 2018
+
+import hashlib
+import json
+import os
+
+import numpy as np
+from scipy.interpolate import RectBivariateSpline
+
+from .radiate import radiate_inelastic_xs
+from .tools import cache_dir
+
+__all__ = ['RadiatedTable']
+
+_floor = 1e-30
+
+
+class RadiatedTable():
+    """
+    Radiated Cross Section Table
+    ----------------------------
+    Radiated cross section of a model on a grid of (ep, theta), for a fixed
+    beam energy and fixed radiation lengths. The table is calculated once,
+    saved in `tools.cache_dir()` under a hash of its parameters, and
+    interpolated with a bicubic spline in the logarithm of the cross section.
+
+    The interpolation error is checked against the exact cross section in the
+    middle of every grid cell, its maximum is `error`.
+
+    Parameters
+    ----------
+    model : PBosted or Elastic
+        Cross section model, its `_xs` method is radiated.
+    e : float
+        Energy of incident electron.
+    tb : float
+        Radiation length before scattering.
+    ta : float
+        Radiation length after scattering.
+    ep_range : (float, float)
+        Range of the energy of scattered electron.
+    theta_range : (float, float)
+        Range of the scattering angle.
+    shape : (int, int)
+        Number of grid points in ep and theta.
+    radiate : callable, optional
+        Radiative correction, default is `radiate.radiate_inelastic_xs` with
+        method 'gauss'. Use `radiate.radiate_elastic_tail` with `Elastic`,
+        the ep range should end below the elastic peak.
+    cache : bool
+        Load and save the table in the cache directory.
+    **kwargs
+        Extra arguments of `radiate`.
+    """
+
+    def __init__(self, model, e, tb, ta, ep_range, theta_range, *,
+                 shape=(51, 11), radiate=None, cache=True, **kwargs):
+        if radiate is None:
+            radiate = radiate_inelastic_xs
+            kwargs.setdefault('method', 'gauss')
+
+        self.model = model
+        self.e = e
+        self.tb = tb
+        self.ta = ta
+        self.ep = np.linspace(*ep_range, shape[0])
+        self.theta = np.linspace(*theta_range, shape[1])
+        self._radiate = radiate
+        self._kwargs = kwargs
+
+        self.file = None
+        if cache:
+            self.file = os.path.join(
+                cache_dir(), 'radiated_{}.npz'.format(self._get_key()))
+
+        if self.file is not None and os.path.exists(self.file):
+            loaded = np.load(self.file)
+            self.xs = loaded['xs']
+            self.error = float(loaded['error'])
+            self._set_spline()
+        else:
+            self.xs = self._calculate(*np.meshgrid(
+                self.ep, self.theta, indexing='ij'))
+            self._set_spline()
+            self.error = self._check()
+            if self.file is not None:
+                self._save()
+
+    def __call__(self, ep, theta):
+        """
+        Interpolate the radiated cross section.
+
+        Parameters
+        ----------
+        ep : float or array of float
+            Energy of scattered electron.
+        theta : float or array of float
+            Scattering angle.
+
+        Returns
+        -------
+        float or array of float
+            Cross section, NaN outside of the table.
+        """
+
+        scalar = np.isscalar(ep) and np.isscalar(theta)
+        ep, theta = np.broadcast_arrays(ep, theta)
+        shape = ep.shape
+        ep, theta = ep.ravel(), theta.ravel()
+
+        result = np.exp(self._spline.ev(ep, theta))
+        result[result <= 2 * _floor] = 0
+        outside = ((ep < self.ep[0]) | (ep > self.ep[-1]) |
+                   (theta < self.theta[0]) | (theta > self.theta[-1]))
+        result[outside] = np.nan
+
+        return result.item() if scalar else result.reshape(shape)
+
+    def _calculate(self, ep, theta):
+        e, ep_flat, theta_flat = np.broadcast_arrays(
+            self.e, ep.ravel(), theta.ravel())
+        result = self._radiate(
+            self.model._xs,
+            self.model.z,
+            self.model.a,
+            e,
+            ep_flat,
+            theta_flat,
+            self.tb,
+            self.ta,
+            **self._kwargs,
+        )
+        return np.asarray(result).reshape(ep.shape)
+
+    def _set_spline(self):
+        self._spline = RectBivariateSpline(
+            self.ep,
+            self.theta,
+            np.log(np.maximum(self.xs, _floor)),
+        )
+
+    def _check(self):
+        ep = (self.ep[1:] + self.ep[:-1]) / 2
+        theta = (self.theta[1:] + self.theta[:-1]) / 2
+        ep, theta = np.meshgrid(ep, theta, indexing='ij')
+
+        exact = self._calculate(ep, theta)
+        select = exact > 0
+        if not np.any(select):
+            return 0.0
+        interpolated = self(ep[select], theta[select])
+        return float(np.max(np.abs(interpolated / exact[select] - 1)))
+
+    def _get_key(self):
+        setting = {
+            'model': type(self.model).__name__,
+            'z': self.model.z,
+            'a': self.model.a,
+            'e': self.e,
+            'tb': self.tb,
+            'ta': self.ta,
+            'ep': [self.ep[0], self.ep[-1], len(self.ep)],
+            'theta': [self.theta[0], self.theta[-1], len(self.theta)],
+            'radiate': self._radiate.__name__,
+            'kwargs': self._kwargs,
+        }
+        for key, value in vars(self.model).items():
+            if key not in setting and np.isscalar(value):
+                setting[key] = value
+        setting = json.dumps(setting, sort_keys=True, default=float)
+        return hashlib.sha1(setting.encode()).hexdigest()[:16]
+
+    def _save(self):
+        temp = self.file + '.{}.tmp.npz'.format(os.getpid())
+        np.savez(temp, xs=self.xs, error=np.array(self.error))
+        os.replace(temp, self.file)
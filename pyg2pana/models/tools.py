@@ -1,8 +1,12 @@
 # Author: Chao Gu, 2018
 
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 from scipy import constants
 
-__all__ = ['mass']
+__all__ = ['cache_dir', 'map_chunks', 'mass']
 
 _ma = constants.value('atomic mass constant energy equivalent in MeV') / 1000
 
@@ -14,3 +18,61 @@ def mass(z, a):
         (6, 12): 12.0107,
         (7, 14): 14.0067,
     }.get((z, a), a) * _ma
+
+
+def cache_dir():
+    """
+    Return the directory of cached model tables, `$PYG2PANA_CACHE` or
+    `~/.cache/pyg2pana`. It is created if needed.
+    """
+
+    path = os.environ.get('PYG2PANA_CACHE')
+    if not path:
+        path = os.path.join(os.path.expanduser('~'), '.cache', 'pyg2pana')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def map_chunks(func, *arrays, workers=None, executor=None, chunks=None):
+    """
+    Evaluate a function on chunks of arrays in parallel.
+
+    Parameters
+    ----------
+    func : callable
+        Function of the arrays, returning an array of the same shape. It must
+        be picklable to be used with a process pool.
+    *arrays : arrays of the same shape
+        Arguments of the function, split into chunks along the flattened
+        points.
+    workers : int, optional
+        Number of processes of the pool created if no `executor` is given.
+    executor : concurrent.futures.Executor, optional
+        Executor to submit the chunks to.
+    chunks : int, optional
+        Number of chunks, default is four times the number of workers.
+
+    Returns
+    -------
+    array
+        The results of all chunks, in the order of the points.
+    """
+
+    shape = np.shape(arrays[0])
+    flat = [np.ravel(x) for x in arrays]
+    if chunks is None:
+        chunks = 4 * (workers or os.cpu_count() or 1)
+    chunks = max(min(chunks, flat[0].size), 1)
+    split = [np.array_split(x, chunks) for x in flat]
+
+    own = executor is None
+    if own:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = [executor.submit(func, *x) for x in zip(*split)]
+        result = np.concatenate([x.result() for x in futures])
+    finally:
+        if own:
+            executor.shutdown()
+
+    return result.reshape(shape)
@@ -0,0 +1,194 @@
+"""
+Cross Section Pipeline
+======================
+
+Calculate the cross section of every momentum setting of a run list with a
+pool of worker processes. The result of each setting is cached, keyed by its
+run, the cuts, the binning, the correction, the target, the record of its run
+in the run database and the size and modification time of its stores, so that
+only the settings with changed inputs are calculated again.
+
+    target -- Parameters of the NH3 target
+    get_luminosity -- Luminosity of a charge on the target
+    cross_section -- Cross section of all settings of a run list
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from os.path import exists, join
+
+import numpy as np
+
+from ._data import Data
+from ._run_db import RunDB
+from ._sim_file import SimFile
+from .models.tools import cache_dir
+
+__all__ = ['cross_section', 'get_luminosity', 'target']
+
+avogadro = 6.023e23  # 1/mol
+charge_e = 1.602176487e-13  # uC
+factor = 1.0e33  # from cm^2/(sr*MeV) to ub/(sr*GeV)
+
+target = {
+    'length': 2.83,  # cm
+    'density': 0.817,  # g/cm^3
+    'a': 17.031,  # g/mol
+    'dilution': 0.17,
+}
+
+
+def get_luminosity(charge, target=target):
+    """
+    Return the luminosity in 1/cm^2 of a charge in uC.
+    """
+
+    return ((charge / charge_e) *
+            (target['density'] / target['a'] * avogadro * target['length']))
+
+
+def cross_section(run_list, cuts, binning, *, correction=None, target=target,
+                  data_dir='data', sim_dir='sim', workers=None, cache=True):
+    """
+    Calculate the cross section of all settings of a run list in parallel.
+
+    Each setting uses its first production run, with the acceptance of the
+    simulation of the same run.
+
+    Parameters
+    ----------
+    run_list : dict
+        Run list keyed by momentum setting, such as `configs.l_22545000`.
+    cuts : dict
+        Cuts of the data and the simulation.
+    binning : dict
+        'bins' and 'range' of the nu histograms.
+    correction : sequence of float, optional
+        Coefficients of the acceptance correction, see
+        `correction.get_weight`.
+    target : dict
+        Target 'length', 'density', 'a' and 'dilution'.
+    data_dir : str
+        Directory of the data stores.
+    sim_dir : str
+        Directory of the simulation stores.
+    workers : int, optional
+        Number of worker processes, default is the number of CPUs.
+    cache : bool or str
+        Load and save the result of each setting in the directory 'xs' of
+        `models.tools.cache_dir()`, or in the given directory.
+
+    Returns
+    -------
+    recarray
+        Fields 'setting' (the central momentum), 'nu', 'xs' and 'error' of
+        every bin of every setting, ordered like `run_list`.
+    """
+
+    if cache is True:
+        cache = join(cache_dir(), 'xs')
+    if cache:
+        os.makedirs(cache, exist_ok=True)
+
+    jobs = []
+    for key, value in run_list.items():
+        run = value['production'][0]
+        jobs.append({
+            'setting': float(key),
+            'run': run,
+            'data': join(data_dir, 'g2p_{}.cols'.format(run)),
+            'sim': join(sim_dir, 'sim_{}.cols'.format(run)),
+            'cuts': cuts,
+            'bins': binning['bins'],
+            'range': list(binning['range']),
+            'correction': None if correction is None else list(correction),
+            'target': target,
+        })
+
+    results = [None] * len(jobs)
+    pending = []
+    for i, job in enumerate(jobs):
+        file_ = None
+        if cache:
+            file_ = join(cache, 'xs_{}.npz'.format(_get_key(job)))
+            if exists(file_):
+                loaded = np.load(file_)
+                results[i] = (loaded['xs'], loaded['error'])
+                continue
+        pending.append((i, job, file_))
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [(i, file_, executor.submit(_setting, job))
+                       for i, job, file_ in pending]
+            for i, file_, future in futures:
+                results[i] = future.result()
+                if file_ is not None:
+                    _save(file_, *results[i])
+
+    bins = binning['bins']
+    low, high = binning['range']
+    width = (high - low) / bins
+    nu = np.linspace(low + width / 2, high - width / 2, bins)
+
+    return np.rec.fromarrays(
+        [
+            np.repeat([x['setting'] for x in jobs], bins),
+            np.tile(nu, len(jobs)),
+            np.concatenate([x[0] for x in results]),
+            np.concatenate([x[1] for x in results]),
+        ],
+        names='setting,nu,xs,error',
+    )
+
+
+def _setting(job):
+    data = Data(job['data'])
+    sim = SimFile(job['sim'])
+
+    data.cuts = job['cuts']
+    sim.cuts = job['cuts']
+
+    binning = {'bins': job['bins'], 'range': job['range']}
+    acceptance = sim.get_acceptance('nu', **binning)
+
+    data.set_weight('scale', data.scale)
+    data.set_weight('dilution', job['target']['dilution'])
+    weights = ['scale', 'dilution']
+    if job['correction'] is not None:
+        data.set_weight('acceptance', job['correction'], 'rec.d')
+        weights.append('acceptance')
+
+    xs = data.get_histogram('nu', **binning, weights=weights)
+    error = data.get_histogram('nu', **binning).astype(np.float64)
+    error[error > 0] = 1 / np.sqrt(error[error > 0])
+
+    xs = xs / acceptance
+    lumi = get_luminosity(data.charge, job['target'])
+    xs = xs / lumi * factor
+
+    return xs, error * xs
+
+
+def _get_key(job):
+    # the stores are identified by the size and mtime of their files
+    inputs = {}
+    for path in (job['data'], job['sim']):
+        for file_ in sorted(os.listdir(path)):
+            stat = os.stat(join(path, file_))
+            inputs[join(path, file_)] = [stat.st_size, stat.st_mtime]
+    # charge, deadtime, prescale, efficiencies and p0 come from the run
+    # database, so the record of the run is part of the key as well
+    inputs['db'] = RunDB.snapshot([job['run']])[0].tolist()
+
+    setting = dict(job, inputs=inputs)
+    setting = json.dumps(setting, sort_keys=True, default=float)
+    return hashlib.sha1(setting.encode()).hexdigest()[:16]
+
+
+def _save(file_, xs, error):
+    temp = file_ + '.{}.tmp.npz'.format(os.getpid())
+    np.savez(temp, xs=xs, error=error)
+    os.replace(temp, file_)
@@ -5,9 +5,8 @@ from os.path import join
 from matplotlib.backends.backend_pdf import PdfPages
 import matplotlib.pyplot as plt
 import numpy as np
-from scipy import interpolate
 
-from pyg2pana import Data, SimFile, configs
+from pyg2pana import Data, SimFile, configs, correction
 
 e0 = 2253.5
 run_list = configs.l_22545000
@@ -36,34 +35,19 @@ for key, value in run_list.items():
 
     run = value['production'][0]
 
-    data = Data(join('data', 'g2p_{}.npz'.format(run)))
-    sim = SimFile(join('sim', 'sim_{}.npz'.format(run)))
+    data = Data(join('data', 'g2p_{}.cols'.format(run)))
+    sim = SimFile(join('sim', 'sim_{}.cols'.format(run)))
 
     data.cuts = cuts
     sim.cuts = cuts
 
     acceptance = sim.get_acceptance('nu', **binning)
 
-    hist, _ = np.histogram(data.nu[data.cuts], **binning)
+    hist = data.get_histogram('nu', **binning)
     hist = hist * data.scale / data.charge / acceptance
 
     hist_list.append(hist)
 
-nu = []
-yield_ = []
-for p0, hist in zip(p0_list, hist_list):
-    nu.append(e0 - p0)
-    center = int((e0 - p0 - (-100)) / 2)
-    temp = 0
-    for i in range(center - 5, center + 6):
-        temp = temp + hist[i]
-    yield_.append(temp / 11)
-
-nu = np.array(nu)
-yield_ = np.array(yield_)
-yield_func = interpolate.interp1d(
-    nu, yield_, kind='cubic', fill_value='extrapolate')
-
 x = np.linspace(
     binning['range'][0] +
     (binning['range'][1] - binning['range'][0]) / binning['bins'] / 2,
@@ -72,29 +56,21 @@ x = np.linspace(
     binning['bins'],
 )
 
-dp_min = 0.039  # 3.9%
-dp_max = 0.039
-dp_list = []
-corr_list = []
-for p0, hist in zip(p0_list[:-1], hist_list[:-1]):
-    center = int((e0 - p0 - (-100)) / 2)
-    min_ = int((e0 - p0 * (1 + dp_min) - (-100)) / 2)
-    max_ = int((e0 - p0 * (1 - dp_max) - (-100)) / 2)
-
-    x_select = x[min_:max_]
-    dp = (e0 - p0 - x_select) / p0
-    corr = yield_func(x_select) / hist[min_:max_]
-    dp_list.append(dp)
-    corr_list.append(corr)
-
-dp = np.concatenate(dp_list)
-corr = np.concatenate(corr_list)
+# the last setting has no neighbour at higher nu
+fit = np.ones(len(p0_list), dtype=bool)
+fit[-1] = False
+result = correction.fit_correction(x, hist_list, e0, p0_list, fit=fit)
+yield_func = result['yield_func']
+pars = result['pars']
+print(pars)
 
-dp = dp[(corr > 0.7) & (corr < 1.3)]
-corr = corr[(corr > 0.7) & (corr < 1.3)]
+select = result['select']
+samples = correction.bootstrap(result['dp'][select], result['corr'][select],
+                               3, seed=0)
+print(np.std(samples, axis=0))
 
-pars = np.polyfit(dp, corr, 3)
-print(pars)
+dp_list = result['dp'][fit]
+corr_list = result['corr'][fit]
 
 with PdfPages('result.pdf') as pdf:
     plt.figure(figsize=(8, 6))
@@ -118,12 +94,7 @@ with PdfPages('result.pdf') as pdf:
     for color, dp, corr in zip(color_list, dp_list, corr_list):
         plt.plot(dp, corr, color + '.', markersize=2.5)
     dp_fit = np.linspace(-0.036, 0.0385, 100)
-    plt.plot(
-        dp_fit,
-        sum(dp_fit**i * par for i, par in enumerate(pars[::-1])),
-        'r-',
-        linewidth=1,
-    )
+    plt.plot(dp_fit, correction.get_weight(dp_fit, pars), 'r-', linewidth=1)
     pdf.savefig(bbox_inches='tight')
     plt.close()
 
@@ -135,8 +106,7 @@ with PdfPages('result.pdf') as pdf:
     for p0, hist in zip(p0_list, hist_list):
         dp = (e0 - p0 - x) / p0
         select = (dp < 0.039) & (dp > -0.039)
-        hist[select] *= sum(
-            dp[select]**i * par for i, par in enumerate(pars[::-1]))
+        hist[select] *= correction.get_weight(dp[select], pars)
         plt.plot(x, hist, 'k.', markersize=2.5)
     pdf.savefig(bbox_inches='tight')
     plt.close()
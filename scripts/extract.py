@@ -1,44 +1,15 @@
 #!/usr/bin/env python3
 
-from os.path import exists, join
-
-from pyg2pana import configs, Data, SimFile
+from pyg2pana import configs, extract
 
 run_list = configs.l_22545000
 
-for key, value in run_list.items():
-    p_runs = value['production']
-    e_runs = value['empty']
-
-    for run in p_runs + e_runs:
-        files = [join('data', 'g2p_{}.root'.format(run))]
-        files += [
-            join('data', 'g2p_{}_{}.root'.format(run, x)) for x in range(1, 3)
-        ]
-        print(files)
-
-        if exists(join('data', 'g2p_{}.npz'.format(run))):
-            continue
-
-        try:
-            data = Data(files)
-        except AttributeError:
-            continue
-        data.save(join('data', 'g2p_{}.npz'.format(run)))
-        del data
-
-    for run in p_runs:
-        files = [
-            join('sim', 'sim_{}_{}.root'.format(run, x)) for x in range(1, 11)
-        ]
-        print(files)
-
-        if exists(join('sim', 'sim_{}.npz'.format(run))):
-            continue
+jobs = extract.get_jobs(run_list, data_dir='data', sim_dir='sim')
+summary = extract.extract_runs(jobs, manifest='extract.json')
 
-        try:
-            sim = SimFile(files)
-        except AttributeError:
-            continue
-        sim.save(join('sim', 'sim_{}.npz'.format(run)))
-        del sim
+print('done: {done}, skipped: {skipped}, missing: {missing}, '
+      'failed: {failed}'.format(**summary))
+print('{} events in {:.1f} s'.format(summary['events'], summary['wall_time']))
+for worker, stats in sorted(summary['workers'].items()):
+    print('worker {}: {} runs, {:.0f} events/s'.format(
+        worker, stats['runs'], stats['rate']))
@@ -5,7 +5,7 @@ import argparse as ap
 import matplotlib.pyplot as plt
 import numpy as np
 
-from pyg2pana import Data
+from pyg2pana import Subtraction
 
 cuts = {
     'y': [-0.015, 0.025],
@@ -22,25 +22,20 @@ args = vars(parser.parse_args())
 run_p = int(args['runs'][0])
 run_e = int(args['runs'][1])
 
-p = Data('data/g2p_{}.npz'.format(run_p))
-e = Data('data/g2p_{}.npz'.format(run_e), ref=run_p)
+sub = Subtraction(
+    ['data/g2p_{}.cols'.format(run_p)],
+    ['data/g2p_{}.cols'.format(run_e)],
+)
+sub.cuts = cuts
 
-p.cuts = cuts
-e.cuts = cuts
-
-yield_p, _ = np.histogram(p.nu[p.cuts], bins=800, range=(-100, 1500))
-yield_e, _ = np.histogram(e.nu[e.cuts], bins=800, range=(-100, 1500))
-
-yield_p = yield_p * p.scale
-yield_e = yield_e * e.scale
-
-yield_sub = yield_p / p.charge - yield_e / e.charge
+yield_sub, error_sub = sub.get_yield('nu', bins=800, range=(-100, 1500))
 
 bin_centers = np.linspace(-99, 1499, 800)
+p0 = sub.production.p0[0]
 
 plt.figure()
 ax = plt.gca()
 plt.xlabel(r'$\nu$')
-plt.xlim(p.p0 * 0.94, p.p0 * 1.06)
-plt.bar(bin_centers, yield_sub, width=2, fill=False)
+plt.xlim(p0 * 0.94, p0 * 1.06)
+plt.bar(bin_centers, yield_sub, width=2, fill=False, yerr=error_sub)
 plt.show()